@@ -0,0 +1,147 @@
+"""
+Benchmark export_playlists_and_tracks and the purge helpers against a local mock of the
+Spotify Web API (see mock_spotify.py), so changes to paging, concurrency, formats or
+purging can be measured without network access or a Spotify account.
+
+Reports, per run: wall time, playlists/s and tracks/s, request count, injected 429s,
+p50/p95 request service time (measured by the mock server), peak Python memory
+(tracemalloc) and bytes written, then the time taken by delete-owner and purge.
+
+    python benchmarks/bench.py --playlists 200 --tracks 500 --workers 8 --page-workers 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import export_json  # noqa: E402
+from export_formats import FORMATS  # noqa: E402
+from purge_utils import purge_expired_exports, delete_exports_for_owner  # noqa: E402
+from metadata_cache import MetadataCache  # noqa: E402
+from instrumentation import percentile  # noqa: E402
+from mock_spotify import SyntheticUser, MockSpotifyServer  # noqa: E402
+
+
+def dir_bytes(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for fname in files:
+            total += os.path.getsize(os.path.join(root, fname))
+    return total
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{n} B"
+        n /= 1024
+
+
+def run_once(server, user, args, out_dir):
+    """One export + purge run into out_dir; returns a dict of measurements."""
+    server.reset_stats()
+    options = dict(export_all=True, ttl_days=0, write_plain_files=args.plain, workers=args.workers,
+                   page_workers=args.page_workers, lean=args.lean, engine=args.engine, fmt=args.format,
+                   normalized=args.normalized, render=args.render.split(',') if args.render else (),
+                   layout=args.layout)
+    if args.enrich:
+        # a cold metadata cache per run, outside out_dir so it is not counted as written output
+        options['metadata_cache'] = MetadataCache(out_dir + '.metadata.sqlite')
+    tracemalloc.start()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        export_json.export_playlists_and_tracks('bench-token', out_dir, **options)
+    elapsed = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    written = dir_bytes(out_dir)
+    latencies = sorted(server.latencies)
+    result = {
+        'seconds': elapsed,
+        'requests': server.requests,
+        'throttled': server.throttled,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'peak_memory': peak,
+        'bytes_written': written,
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        delete_exports_for_owner(out_dir, user.playlists[0]['owner']['id'])
+        result['delete_owner_seconds'] = time.perf_counter() - started
+        started = time.perf_counter()
+        purge_expired_exports(out_dir)
+        result['purge_seconds'] = time.perf_counter() - started
+    return result
+
+
+def report(results, user):
+    playlists = len(user.playlists)
+    tracks = sum(p['tracks']['total'] for p in user.playlists)
+    print(f"\n{'run':>4} {'wall s':>8} {'pl/s':>8} {'tracks/s':>10} {'reqs':>6} {'429s':>5} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'peak mem':>10} {'written':>10} {'del-owner s':>11} {'purge s':>8}")
+    for i, r in enumerate(results, start=1):
+        print(f"{i:>4} {r['seconds']:>8.2f} {playlists / r['seconds']:>8.1f} {tracks / r['seconds']:>10.0f} "
+              f"{r['requests']:>6} {r['throttled']:>5} {r['p50'] * 1000:>7.2f} {r['p95'] * 1000:>7.2f} "
+              f"{format_bytes(r['peak_memory']):>10} {format_bytes(r['bytes_written']):>10} "
+              f"{r['delete_owner_seconds']:>11.3f} {r['purge_seconds']:>8.3f}")
+    if len(results) > 1:
+        best = min(results, key=lambda r: r['seconds'])
+        print(f"\nbest: {best['seconds']:.2f}s ({tracks / best['seconds']:.0f} tracks/s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark playlist exports against a local mock Spotify API')
+    parser.add_argument('--playlists', type=int, default=50, help='Synthetic playlists (default: 50)')
+    parser.add_argument('--tracks', type=int, default=200, help='Maximum tracks per playlist (default: 200)')
+    parser.add_argument('--overlap', type=float, default=0.3,
+                        help='Share of tracks drawn from a pool common to all playlists (default: 0.3)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic user (default: 1)')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='Probability that a request is answered with 429 (default: 0)')
+    parser.add_argument('--retry-after', type=int, default=0,
+                        help='Retry-After seconds sent with injected 429s (default: 0)')
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='Simulated network latency added to every request (default: 0)')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--page-workers', type=int, default=1)
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('--lean', action='store_true')
+    parser.add_argument('--normalized', action='store_true')
+    parser.add_argument('--layout', choices=['flat', 'sharded'], default='flat')
+    parser.add_argument('--plain', action='store_true', help='Also write the plain .txt files')
+    parser.add_argument('--render', default='', help='Comma-separated formats to render (txt,csv,m3u,md)')
+    parser.add_argument('--enrich', action='store_true', help='Run the track/artist metadata enrichment stage')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs (default: 1)')
+    args = parser.parse_args(argv)
+
+    user = SyntheticUser(playlists=args.playlists, tracks=args.tracks, overlap=args.overlap, seed=args.seed)
+    tracks = sum(p['tracks']['total'] for p in user.playlists)
+    print(f"Synthetic user: {len(user.playlists)} playlists, {tracks} tracks "
+          f"(engine={args.engine}, workers={args.workers}, page_workers={args.page_workers}, format={args.format})")
+    results = []
+    with MockSpotifyServer(user, rate_429=args.rate_429, retry_after=args.retry_after, seed=args.seed,
+                           latency=args.latency_ms / 1000) as server:
+        export_json.API_BASE = server.base_url
+        for _ in range(args.repeat):
+            out_dir = tempfile.mkdtemp(prefix='spotify_bench_')
+            try:
+                results.append(run_once(server, user, args, out_dir))
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+                if os.path.exists(out_dir + '.metadata.sqlite'):
+                    os.remove(out_dir + '.metadata.sqlite')
+    report(results, user)
+
+
+if __name__ == '__main__':
+    main()
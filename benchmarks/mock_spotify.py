@@ -0,0 +1,209 @@
+"""
+Local stand-in for the parts of the Spotify Web API used by the exporter.
+Serves /v1/me/playlists and /v1/playlists/{id}/tracks with offset/limit paging,
+the /v1/tracks?ids= and /v1/artists?ids= batch lookups, `next` links, `total`, ETags (If-None-Match -> 304), optionally injected 429s
+with Retry-After and a fixed per-request network latency, and records the service time of every request. Playlists and tracks are generated deterministically from a seed,
+so nothing is held in memory per track.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+TRACKS_PATH = re.compile(r'^/v1/playlists/([^/]+)/tracks$')
+
+
+class SyntheticUser:
+    """A user with `playlists` playlists of up to `tracks` tracks each; `overlap` is the share of tracks
+    drawn from a common pool (so they appear in several playlists)."""
+
+    def __init__(self, playlists=50, tracks=200, overlap=0.3, artists=500, seed=1):
+        rng = random.Random(seed)
+        self.overlap = overlap
+        self.artists = artists
+        self.seed = seed
+        self.pool_size = max(1, playlists * tracks // 4)
+        self.playlists = []
+        for i in range(playlists):
+            self.playlists.append({
+                'id': f"pl{i:06d}",
+                'name': f"Synthetic playlist {i}",
+                'owner': {'id': f"owner{i % 3}"},
+                'snapshot_id': f"snap{seed}-{i}",
+                'tracks': {'total': rng.randint(max(1, tracks // 2), tracks)}
+            })
+        self.by_id = {p['id']: p for p in self.playlists}
+
+    def track_item(self, playlist_id, index):
+        """Playlist item at index, generated from (seed, playlist, index)."""
+        h = int(hashlib.md5(f"{self.seed}:{playlist_id}:{index}".encode()).hexdigest(), 16)
+        if (h % 1000) / 1000 < self.overlap:
+            track_id = f"shared{h % self.pool_size:08d}"
+        else:
+            track_id = f"{playlist_id}t{index:06d}"
+        return {'added_at': '2024-01-01T00:00:00Z', 'track': self.track(track_id)}
+
+    def track(self, track_id):
+        """Full track object of track_id, generated from the id."""
+        th = int(hashlib.md5(track_id.encode()).hexdigest(), 16)
+        artists = [{'id': f"artist{(th >> (8 * k)) % self.artists:05d}",
+                    'name': f"Artist {(th >> (8 * k)) % self.artists}"} for k in range(1 + th % 3)]
+        return {
+            'id': track_id,
+            'name': f"Track {track_id}",
+            'artists': artists,
+            'duration_ms': 60000 + th % 300000,
+            'album': {'id': f"album{th % 1000:05d}", 'name': f"Album {th % 1000}",
+                      'release_date': f"{1970 + th % 55}-01-01",
+                      'images': [{'url': 'https://example.invalid/x.jpg'}] * 3},
+            'available_markets': ['US', 'GB', 'DE', 'FR', 'SE'],
+            'external_ids': {'isrc': f"XX{th % 10 ** 10:010d}"},
+            'external_urls': {'spotify': f"https://open.spotify.com/track/{track_id}"}
+        }
+
+    def artist(self, artist_id):
+        """Full artist object of artist_id, or None for an id the user's tracks never use."""
+        match = re.match(r'^artist(\d+)$', artist_id)
+        if not match or int(match.group(1)) >= self.artists:
+            return None
+        n = int(match.group(1))
+        return {'id': artist_id, 'name': f"Artist {n}", 'genres': [f"genre{n % 40}", f"genre{n % 7}"],
+                'popularity': n % 100}
+
+
+class MockSpotifyServer:
+    """Threaded HTTP server for a SyntheticUser. Use start()/stop() or as a context manager."""
+
+    def __init__(self, user, rate_429=0.0, retry_after=0, port=0, seed=1, latency=0.0):
+        self.user = user
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self.latencies = []
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = self.throttled = self.not_modified = 0
+            self.latencies = []
+
+    def _page(self, path, query):
+        offset = int(query.get('offset', ['0'])[0])
+        if path in ('/v1/tracks', '/v1/artists'):
+            ids = query.get('ids', [''])[0].split(',')[:50]
+            lookup = self.user.track if path == '/v1/tracks' else self.user.artist
+            return {path[4:]: [lookup(i) if i else None for i in ids]}
+        if path == '/v1/me/playlists':
+            limit = min(50, int(query.get('limit', ['20'])[0]))
+            total = len(self.user.playlists)
+            items = self.user.playlists[offset:offset + limit]
+        else:
+            match = TRACKS_PATH.match(path)
+            playlist = self.user.by_id.get(match.group(1)) if match else None
+            if playlist is None:
+                return None
+            limit = min(100, int(query.get('limit', ['100'])[0]))
+            total = playlist['tracks']['total']
+            items = [self.user.track_item(playlist['id'], i) for i in range(offset, min(offset + limit, total))]
+        next_url = None
+        if offset + limit < total:
+            next_url = f"{self.base_url}{path[3:]}?offset={offset + limit}&limit={limit}"
+        return {'href': f"{self.base_url}{path[3:]}", 'items': items, 'limit': limit, 'offset': offset,
+                'total': total, 'next': next_url, 'previous': None}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # kept-alive connections: without TCP_NODELAY the small writes of a response stall
+            # on the client's delayed ACK, which makes pooled sessions look slower than fresh ones
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client dropped a kept-alive connection (e.g. a cancelled export)
+                    self.close_connection = True
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up on the request (e.g. a cancelled export)
+                    self.close_connection = True
+
+            def do_GET(self):
+                started = time.perf_counter()
+                try:
+                    self._get()
+                finally:
+                    with server.lock:
+                        server.latencies.append(time.perf_counter() - started)
+
+            def _get(self):
+                with server.lock:
+                    server.requests += 1
+                    throttle = server.rate_429 > 0 and server.rng.random() < server.rate_429
+                    if throttle:
+                        server.throttled += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if throttle:
+                    self._send(429, b'{"error":{"status":429}}', {'Retry-After': str(server.retry_after)})
+                    return
+                parsed = urlparse(self.path)
+                page = server._page(parsed.path, parse_qs(parsed.query))
+                if page is None:
+                    self._send(404, b'{"error":{"status":404,"message":"Not found"}}')
+                    return
+                body = json.dumps(page).encode('utf-8')
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    with server.lock:
+                        server.not_modified += 1
+                    self._send(304, headers={'ETag': etag})
+                    return
+                self._send(200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+        return Handler
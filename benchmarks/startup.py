@@ -0,0 +1,80 @@
+"""
+Startup cost of the CLI subcommands: the import time spent on top of a bare interpreter
+(from python -X importtime) and the wall time of complete runs, for the maintenance commands
+that cron runs often. Exits with status 1 when a command exceeds the import budget.
+
+    python benchmarks/startup.py --budget-ms 30 --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'main.py')
+
+# maintenance commands against an empty export directory (argv after main.py; {out} is replaced)
+COMMANDS = (
+    ('purge', ['purge', '--out', '{out}']),
+    ('delete-owner', ['delete-owner', 'someone', '--out', '{out}']),
+    ('rebuild-index', ['rebuild-index', '--out', '{out}']),
+    ('purge-all', ['purge-all', '--yes', '--out', '{out}']),
+    ('--purge (old flag)', ['--purge', '--out', '{out}']),
+)
+
+
+def top_level_imports(argv):
+    """{module: cumulative microseconds} of the top-level imports of `python -X importtime argv`."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime'] + argv, capture_output=True, text=True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith(' ') and not name.startswith('  '):
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def wall_time(argv, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable] + argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure CLI startup cost of the maintenance commands')
+    parser.add_argument('--budget-ms', type=float, default=30.0,
+                        help='Import time allowed on top of a bare interpreter (default: 30 ms)')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per command for the wall time (default: 5)')
+    args = parser.parse_args(argv)
+
+    baseline = top_level_imports(['-c', 'pass'])
+    baseline_wall = wall_time(['-c', 'pass'], args.runs)
+    over = []
+    with tempfile.TemporaryDirectory() as out:
+        print(f"{'command':<20} {'imports ms':>10} {'wall ms':>8} {'vs bare ms':>10}  slowest imports")
+        for label, command in COMMANDS:
+            command = [MAIN] + [a.replace('{out}', out) for a in command]
+            modules = {m: us for m, us in top_level_imports(command).items() if m not in baseline}
+            import_ms = sum(modules.values()) / 1000
+            wall_ms = wall_time(command, args.runs) * 1000
+            slowest = ", ".join(f"{m} {us / 1000:.1f}" for m, us in
+                                sorted(modules.items(), key=lambda kv: -kv[1])[:3])
+            print(f"{label:<20} {import_ms:>10.1f} {wall_ms:>8.1f} {wall_ms - baseline_wall * 1000:>10.1f}  {slowest}")
+            if import_ms > args.budget_ms:
+                over.append(label)
+    if over:
+        print(f"\nOver the {args.budget_ms:g} ms import budget: {', '.join(over)}")
+        return 1
+    print(f"\nAll maintenance commands are within the {args.budget_ms:g} ms import budget.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
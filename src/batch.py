@@ -0,0 +1,86 @@
+"""
+Multi-account batch export: exports every account listed in an accounts file in one
+process. All accounts share the HTTP session, rate limiter, response cache (whose /me
+entries are kept per account, see http_cache) and one pool of playlist workers; each
+account gets its own TokenManager and output directory (<out>/<name>), and a failing
+account (bad refresh token, API error) is reported without stopping the others.
+
+The accounts file is a JSON list of objects:
+  [{"name": "alice", "refresh_token": "..."},
+   {"name": "bob", "refresh_token": "...", "client_id": "...", "client_secret": "...", "out": "exports/bob"}]
+client_id / client_secret default to SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET.
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from token_manager import TokenManager
+from export_json import export_playlists_and_tracks
+from spotify_api import ensure_pool_size
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def load_accounts(path, client_id=None, client_secret=None):
+    """Read and validate the accounts file; returns a list of account dicts with name and credentials."""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    if not isinstance(raw, list):
+        raise ValueError(f"{path}: expected a JSON list of accounts")
+    accounts = []
+    names = set()
+    for i, entry in enumerate(raw):
+        if not isinstance(entry, dict) or not entry.get('refresh_token'):
+            raise ValueError(f"{path}: account #{i} has no refresh_token")
+        name = _UNSAFE_NAME.sub('_', str(entry.get('name') or f"account{i}"))
+        if name in names:
+            raise ValueError(f"{path}: duplicate account name '{name}'")
+        names.add(name)
+        account = dict(entry, name=name)
+        account.setdefault('client_id', client_id)
+        account.setdefault('client_secret', client_secret)
+        if not account['client_id'] or not account['client_secret']:
+            raise ValueError(f"{path}: account '{name}' has no client_id / client_secret")
+        accounts.append(account)
+    return accounts
+
+
+def export_accounts(accounts, out_root, account_workers=1, workers=1, page_workers=1, **export_options):
+    """
+    Export every account (all playlists, no prompts). account_workers accounts run at once;
+    their playlists share one pool of `workers` threads. Returns {name: result}, where result
+    is the number of exported playlists or the exception that stopped the account.
+    """
+    account_workers = max(1, account_workers or 1)
+    workers = max(1, workers or 1)
+    # size the shared session up front so no account recreates it under the others
+    ensure_pool_size(account_workers * workers * max(1, page_workers or 1))
+    results = {}
+
+    def run(account, pool):
+        out_dir = account.get('out') or os.path.join(out_root, account['name'])
+        os.makedirs(out_dir, exist_ok=True)
+        token = TokenManager(account['client_id'], account['client_secret'], account['refresh_token'])
+        print(f"\n=== Account {account['name']} -> {out_dir} ===")
+        selected = export_playlists_and_tracks(token, out_dir, export_all=True, workers=workers,
+                                               page_workers=page_workers, executor=pool, **export_options)
+        return len(selected or [])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=account_workers) as drivers:
+        futures = {drivers.submit(run, account, pool if workers > 1 else None): account for account in accounts}
+        for fut in as_completed(futures):
+            name = futures[fut]['name']
+            try:
+                result = fut.result()
+            except Exception as e:
+                print(f"Account {name} failed: {e}")
+                result = e
+            results[name] = result
+
+    print("\nBatch summary:")
+    for account in accounts:
+        result = results.get(account['name'])
+        status = f"failed: {result}" if isinstance(result, Exception) else f"{result} playlists"
+        print(f"  {account['name']}: {status}")
+    return results
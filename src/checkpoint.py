@@ -0,0 +1,156 @@
+"""
+On-disk checkpoints of an export run, for --resume.
+The run state lives in .export_checkpoint/ in the output directory: options.json holds
+the run settings (written once per run) and completed.ndjson gets one line per exported
+playlist, with its snapshot_id, so recording a playlist costs one small append however
+many playlists the run has; the log is replayed on resume. The playlist currently being
+written also has its pages appended to .export_checkpoint/<playlist_id>.ndjson by the
+writer, reduced to the track fields an export is built from (see export_json.resume_track)
+rather than the raw API items. A run started with resume=True skips the completed
+playlists and replays the saved pages before asking the API for the remaining offsets.
+The checkpoint is removed when a run completes.
+"""
+import json
+import os
+import shutil
+import threading
+
+CHECKPOINT_DIRNAME = '.export_checkpoint'
+OPTIONS_FILENAME = 'options.json'
+COMPLETED_FILENAME = 'completed.ndjson'
+
+
+class Checkpoint:
+    """Checkpoint of one export run into out_dir; options are the run settings that must match to resume."""
+
+    def __init__(self, out_dir, options, resume=False):
+        self.dir = os.path.join(out_dir, CHECKPOINT_DIRNAME)
+        self.options_path = os.path.join(self.dir, OPTIONS_FILENAME)
+        self.completed_path = os.path.join(self.dir, COMPLETED_FILENAME)
+        self.options = options
+        self.completed = {}
+        self._lock = threading.Lock()
+        saved_options = self._load_options() if resume else None
+        if resume and saved_options is None:
+            print('No checkpoint to resume from; starting a full export.')
+        elif saved_options is not None and saved_options != options:
+            print('The checkpoint was written with other export options; starting a full export.')
+            saved_options = None
+        if saved_options is None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            os.makedirs(self.dir, exist_ok=True)
+            tmp_path = self.options_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(options, f)
+            os.replace(tmp_path, self.options_path)
+        else:
+            self.completed = self._load_completed()
+            print(f"Resuming: {len(self.completed)} playlists already exported.")
+        # rewritten from the replayed entries, so a torn last line from a crash is dropped
+        self._log = open(self.completed_path, 'w', encoding='utf-8')
+        for playlist_id, snapshot_id in self.completed.items():
+            self._log.write(json.dumps([playlist_id, snapshot_id]) + "\n")
+        self._log.flush()
+
+    def _load_options(self):
+        try:
+            with open(self.options_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _load_completed(self):
+        """Replay the completed log: {playlist_id: snapshot_id}. A torn last line is ignored."""
+        completed = {}
+        try:
+            with open(self.completed_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    playlist_id, snapshot_id = json.loads(line)
+                    completed[playlist_id] = snapshot_id
+        except (OSError, ValueError):
+            pass
+        return completed
+
+    def _pages_path(self, playlist_id):
+        return os.path.join(self.dir, f"{playlist_id}.ndjson")
+
+    def is_completed(self, pl):
+        """True if pl was exported by the checkpointed run and has not changed since."""
+        with self._lock:
+            return pl['id'] in self.completed and self.completed[pl['id']] == pl.get('snapshot_id')
+
+    def mark_completed(self, pl):
+        """Record pl as exported and drop its saved pages."""
+        with self._lock:
+            self.completed[pl['id']] = pl.get('snapshot_id')
+            self._log.write(json.dumps([pl['id'], pl.get('snapshot_id')]) + "\n")
+            self._log.flush()
+        try:
+            os.remove(self._pages_path(pl['id']))
+        except FileNotFoundError:
+            pass
+
+    def saved_pages(self, pl):
+        """
+        Raw item pages saved for pl by the checkpointed run, in API order (an empty list when
+        there are none or the playlist changed since). A torn last line is ignored.
+        """
+        path = self._pages_path(pl['id'])
+        pages = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                head = json.loads(f.readline() or 'null')
+                if not head or head.get('snapshot_id') != pl.get('snapshot_id'):
+                    return []
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    pages.append(json.loads(line))
+        except (OSError, ValueError):
+            return pages
+        return pages
+
+    def page_log(self, pl):
+        """PageLog for the pages of pl (the replayed saved pages are written to it again)."""
+        return PageLog(self._pages_path(pl['id']), pl.get('snapshot_id'))
+
+    def finish(self):
+        """Remove the checkpoint after a completed run."""
+        with self._lock:
+            self._log.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class PageLog:
+    """Append-only file of the (reduced) pages of one playlist; open() and close() it, or use as a context manager."""
+
+    def __init__(self, path, snapshot_id):
+        self.path = path
+        self.snapshot_id = snapshot_id
+        self._f = None
+
+    def open(self):
+        # rewritten rather than appended to, so a torn last line from a crash is dropped
+        self._f = open(self.path, 'w', encoding='utf-8')
+        self._f.write(json.dumps({'snapshot_id': self.snapshot_id}) + "\n")
+        self._f.flush()
+        return self
+
+    def add(self, items):
+        """Persist one page of items (flushed, so it survives the process dying)."""
+        self._f.write(json.dumps(items, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,51 @@
+"""
+Daemon (watch) mode: re-sync the exports on a fixed interval in one long-running
+process, so the HTTP session, the access token and the response cache stay warm
+between cycles instead of being rebuilt by every cron run. Expired exports are
+purged after each cycle. SIGTERM / SIGINT stop the daemon once the playlists in
+progress are written; a second signal exits immediately.
+"""
+import signal
+import threading
+import time
+from utils import now_iso_utc
+from purge_utils import purge_expired_exports
+
+
+def run_daemon(sync_cycle, out_dir, interval, purge=True):
+    """
+    Call sync_cycle(stop_event) every interval seconds (start to start) until SIGTERM or
+    SIGINT, then purge expired exports in out_dir. A failing cycle is reported and the
+    daemon carries on with the next one.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        print(f"\nReceived {signal.Signals(signum).name}, stopping after the playlists in progress...")
+        stop.set()
+
+    previous = {sig: signal.signal(sig, request_stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    cycle = 0
+    try:
+        while not stop.is_set():
+            cycle += 1
+            started = time.monotonic()
+            print(f"\n=== Sync cycle {cycle} ({now_iso_utc()}) ===")
+            try:
+                sync_cycle(stop)
+            except Exception as e:
+                print(f"Sync cycle {cycle} failed: {e}")
+            if purge and not stop.is_set():
+                removed = purge_expired_exports(out_dir)
+                print(f"Purged {len(removed)} expired files.")
+            if stop.is_set():
+                break
+            wait = max(0.0, interval - (time.monotonic() - started))
+            print(f"Next sync in {wait:.0f} seconds.")
+            stop.wait(wait)
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+    print("Daemon stopped.")
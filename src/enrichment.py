@@ -0,0 +1,113 @@
+"""
+Optional enrichment stage run after the track loop (--enrich): the distinct track ids
+of the run are resolved through the batch endpoints (GET /tracks?ids=, GET /artists?ids=,
+up to 50 ids per call) into album name, release date, ISRC and artist genres.
+Results are kept in a persistent MetadataCache, so only ids that are new or whose entry
+expired are requested again, and written to track_metadata.json in the output directory
+as {"tracks": {track_id: {...}}, "artists": {artist_id: {...}}}. Entries from earlier
+runs are kept, so playlists skipped by --incremental / --resume stay covered.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from spotify_api import spotify_get
+
+METADATA_SIDECAR = 'track_metadata.json'
+BATCH_SIZE = 50
+
+
+def track_metadata(track):
+    """Reduce a full track object to the enrichment fields."""
+    album = track.get('album') or {}
+    return {
+        'album': album.get('name'),
+        'album_id': album.get('id'),
+        'release_date': album.get('release_date'),
+        'isrc': (track.get('external_ids') or {}).get('isrc'),
+        'artist_ids': [a['id'] for a in track.get('artists', []) or [] if a.get('id')]
+    }
+
+
+def artist_metadata(artist):
+    """Reduce a full artist object to the enrichment fields."""
+    return {'name': artist.get('name'), 'genres': artist.get('genres') or []}
+
+
+def fetch_batches(endpoint, key, ids, access_token, reduce, workers=1):
+    """
+    Resolve ids through a batch endpoint ({API_BASE}/tracks, .../artists) in calls of
+    BATCH_SIZE ids, `workers` calls at a time. Returns {id: reduce(object)}; ids the API
+    answers with null (unknown or unavailable) are left out.
+    """
+    ids = sorted(ids)
+    batches = [ids[i:i + BATCH_SIZE] for i in range(0, len(ids), BATCH_SIZE)]
+
+    def fetch(batch):
+        data = spotify_get(endpoint, access_token, params={'ids': ','.join(batch)})
+        return {obj['id']: reduce(obj) for obj in data.get(key) or [] if obj and obj.get('id')}
+
+    resolved = {}
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for found in pool.map(fetch, batches):
+                resolved.update(found)
+    else:
+        for batch in batches:
+            resolved.update(fetch(batch))
+    return resolved
+
+
+def resolve(kind, ids, endpoint, key, reduce, access_token, cache, workers=1):
+    """{id: metadata} for ids: cached entries first, the rest from the batch endpoint (and cached)."""
+    found = cache.get_many(kind, ids)
+    missing = set(ids) - found.keys()
+    if missing:
+        fetched = fetch_batches(endpoint, key, missing, access_token, reduce, workers)
+        cache.put_many(kind, fetched)
+        found.update(fetched)
+    print(f"Enrichment: {len(ids)} {kind}s, {len(ids) - len(missing)} cached, {len(missing)} requested")
+    return found
+
+
+def _load_sidecar(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {'tracks': {}, 'artists': {}}
+    return {'tracks': data.get('tracks', {}), 'artists': data.get('artists', {})}
+
+
+def enrich_tracks(track_ids, access_token, out_dir, cache, api_base, workers=1):
+    """
+    Resolve the metadata of track_ids (and of their artists) and merge it into
+    out_dir/track_metadata.json. Each track entry also lists the genres of its artists.
+    Returns the path of the sidecar file.
+    """
+    evicted = cache.evict_expired()
+    if evicted:
+        print(f"Enrichment: evicted {evicted} expired metadata entries")
+    # local files have no Spotify id (normalized exports give them a synthetic local: one)
+    track_ids = {t for t in track_ids if t and not t.startswith('local:')}
+    tracks = resolve('track', track_ids, f"{api_base}/tracks", 'tracks', track_metadata,
+                     access_token, cache, workers)
+    artist_ids = {a for meta in tracks.values() for a in meta['artist_ids']}
+    artists = resolve('artist', artist_ids, f"{api_base}/artists", 'artists', artist_metadata,
+                      access_token, cache, workers)
+
+    path = os.path.join(out_dir, METADATA_SIDECAR)
+    sidecar = _load_sidecar(path)
+    for track_id, meta in tracks.items():
+        genres = []
+        for artist_id in meta['artist_ids']:
+            for genre in (artists.get(artist_id) or {}).get('genres', []):
+                if genre not in genres:
+                    genres.append(genre)
+        sidecar['tracks'][track_id] = dict(meta, genres=genres)
+    sidecar['artists'].update(artists)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(sidecar, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    print(f"Track metadata written: {path} ({len(tracks)} tracks, {len(artists)} artists)")
+    return path
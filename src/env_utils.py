@@ -1,12 +1,27 @@
 """
 Helpers to read/write the .env file using python-dotenv.
+Nothing happens at import time: the .env is searched for (find_dotenv walks up the
+directory tree) and python-dotenv is imported on first use, so commands that never
+touch the .env do not pay for either.
 """
 import os
-from dotenv import load_dotenv, set_key, find_dotenv
 
-# Find or create .env path
-ENV_PATH = find_dotenv() or os.path.join(os.getcwd(), '.env')
-load_dotenv(ENV_PATH)
+_env_path = None
+
+
+def default_env_path():
+    """The .env found by python-dotenv, or ./.env when there is none (searched once)."""
+    global _env_path
+    if _env_path is None:
+        from dotenv import find_dotenv
+        _env_path = find_dotenv() or os.path.join(os.getcwd(), '.env')
+    return _env_path
+
+
+def load_env(path=None):
+    """Load path (default: default_env_path()) into os.environ without overriding set variables."""
+    from dotenv import load_dotenv
+    load_dotenv(path or default_env_path())
 
 
 def ensure_env_file(path):
@@ -14,21 +29,22 @@ def ensure_env_file(path):
     if not os.path.exists(path):
         with open(path, 'w', encoding='utf-8') as f:
             f.write('')
-    load_dotenv(path)
+    load_env(path)
     return path
 
 
 def save_to_env(key, value, env_path_local=None):
     """Save key=value into the specified .env file and reload env vars."""
-    path = env_path_local or ENV_PATH
+    from dotenv import set_key
+    path = env_path_local or default_env_path()
     ensure_env_file(path)
     set_key(path, key, value)
-    load_dotenv(path)
+    load_env(path)
 
 
 def remove_env_key(key, env_path_local=None):
     """Remove a key from the .env file (line-based) and reload env vars."""
-    path = env_path_local or ENV_PATH
+    path = env_path_local or default_env_path()
     if not os.path.exists(path):
         return False
     kept = []
@@ -41,5 +57,5 @@ def remove_env_key(key, env_path_local=None):
             kept.append(line)
     with open(path, 'w', encoding='utf-8') as f:
         f.writelines(kept)
-    load_dotenv(path)
+    load_env(path)
     return removed
@@ -0,0 +1,96 @@
+"""
+asyncio export engine: exports the selected playlists as coroutines over one
+AsyncSpotifyClient, bounded by a concurrency semaphore. Produces the same files
+as export_json.export_playlist (it reuses its writer and incremental checks).
+"""
+import asyncio
+from functools import partial
+from instrumentation import PlaylistTimer
+from export_json import prepare_playlist, write_page, finish_playlist, tracks_request, checkpoint_pages, _log
+from write_stage import InlineStage, PageQueue
+
+
+async def export_playlist_async(client, pl, out_dir, *, ttl_days=2, renderers=(), page_workers=1,
+                                incremental=False, lean=False, fmt='json', archive=None, store=None,
+                                checkpoint=None, track_ids=None, stage=None, layout='flat', search_index=True):
+    """
+    Async export_playlist; pages are written on stage (a write_stage.WriteStage) and the
+    checkpoint and incremental-mode file reads run in the executor, so nothing blocks the
+    loop. Returns the number of tracks written, or None if unchanged or already exported.
+    """
+    timer = PlaylistTimer(pl['id'])
+    if checkpoint is not None and checkpoint.is_completed(pl):
+        timer.finish(None)
+        return None
+    loop = asyncio.get_running_loop()
+    saved, page_log = await loop.run_in_executor(None, checkpoint_pages, checkpoint, pl)
+    writer = await loop.run_in_executor(None, partial(
+        prepare_playlist, pl, out_dir, ttl_days=ttl_days, renderers=renderers, quiet=True, incremental=incremental,
+        fmt=fmt, archive=archive, store=store, layout=layout, page_log=page_log, search_index=search_index))
+    if writer is None:
+        if checkpoint is not None:
+            await loop.run_in_executor(None, checkpoint.mark_completed, pl)
+        timer.finish(None)
+        return None
+    pages = PageQueue(stage if stage is not None else InlineStage())
+    await pages.put_async(writer.open)
+    try:
+        offset = 0
+        for page in saved:
+            await pages.put_async(write_page, writer, page, store, timer, track_ids)
+            offset += len(page)
+        url, params = tracks_request(pl['id'], lean, offset)
+        timer.mark()
+        async for page in client.iter_pages(url, params=params, page_workers=page_workers):
+            timer.lap('fetch')
+            await pages.put_async(write_page, writer, page, store, timer, track_ids)
+            timer.mark()
+    except BaseException as e:
+        pages.abort(writer.close, e)
+        raise
+    # shielded: a fully fetched playlist is finished by the writer even if the task is cancelled
+    return await asyncio.shield(asyncio.wrap_future(
+        pages.close(lambda: finish_playlist(writer, pl, checkpoint, timer, quiet=True), writer.close)))
+
+
+async def export_selected_async(selected, access_token, out_dir, *, ttl_days=2, renderers=(),
+                                concurrency=1, page_workers=1, incremental=False, lean=False, fmt='json',
+                                archive=None, store=None, stop_event=None, checkpoint=None, track_ids=None,
+                                stage=None, layout='flat', search_index=True):
+    """
+    Export every playlist in selected with at most `concurrency` playlists in flight.
+    Once stop_event is set, playlists that have not started yet are skipped.
+    """
+    from spotify_api_async import AsyncSpotifyClient
+
+    concurrency = max(1, concurrency or 1)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(pl):
+        async with semaphore:
+            if stop_event is not None and stop_event.is_set():
+                return pl, False
+            return pl, await export_playlist_async(
+                client, pl, out_dir, ttl_days=ttl_days, renderers=renderers, page_workers=page_workers,
+                incremental=incremental, lean=lean, fmt=fmt, archive=archive, store=store,
+                checkpoint=checkpoint, track_ids=track_ids, stage=stage, layout=layout,
+                search_index=search_index)
+
+    total = len(selected)
+    print(f"\nExporting {total} playlists with the async engine ({concurrency} in flight)...")
+    async with AsyncSpotifyClient(access_token, pool_size=concurrency * max(1, page_workers or 1)) as client:
+        tasks = [asyncio.ensure_future(run(pl)) for pl in selected]
+        try:
+            for done, fut in enumerate(asyncio.as_completed(tasks), start=1):
+                pl, count = await fut
+                if count is False:
+                    continue
+                status = "unchanged" if count is None else f"{count} tracks"
+                _log(f"[{done}/{total}] {pl['name']} (id={pl['id']}) — {status}")
+        except Exception as e:
+            _log(f"Export failed: {e}")
+            # stop the remaining playlists, same as the threaded path aborting
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
@@ -0,0 +1,257 @@
+"""
+On-disk formats of playlist exports and the helpers that read or patch them.
+  json     playlist_<id>.json, pretty-printed (indent=2) — the default
+  ndjson   playlist_<id>.ndjson, header object on the first line, then one track per line
+  json.gz  / json.xz   the json format, gzip / xz compressed
+  archive  every playlist of a run in one export_<timestamp>.zip (members playlist_<id>.json and
+           its rendered files)
+All formats keep the header fields (owner_id, expires_at, ...) before the tracks, so
+they can be read without parsing the tracks.
+"""
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+FORMATS = ('json', 'ndjson', 'json.gz', 'json.xz', 'archive')
+# longest suffixes first so that .json.gz is not taken for .json
+EXPORT_SUFFIXES = ('.json.gz', '.json.xz', '.ndjson', '.json')
+ARCHIVE_PREFIX = 'export_'
+ARCHIVE_SUFFIX = '.zip'
+# files rendered next to an export (see renderers), by format name
+RENDER_SUFFIXES = {'txt': '.txt', 'csv': '.csv', 'm3u': '.m3u', 'md': '.md'}
+TEMP_PREFIX = '.tmp-'
+
+_NDJSON_EXPIRES_MARKER = b',"expires_at":"'
+_JSON_EXPIRES_MARKER = b'\n  "expires_at": "'
+
+
+def export_suffix(fname):
+    """Return the export suffix of a file name ('.json', '.json.gz', ...) or None."""
+    for suffix in EXPORT_SUFFIXES:
+        if fname.endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive(fname):
+    return fname.startswith(ARCHIVE_PREFIX) and fname.endswith(ARCHIVE_SUFFIX)
+
+
+def export_filename(playlist_id, fmt='json'):
+    """File name of a playlist export in fmt (for archives, the member name)."""
+    if fmt == 'archive':
+        fmt = 'json'
+    return f"playlist_{playlist_id}.{fmt}"
+
+
+def rendered_siblings(path):
+    """Paths of the rendered files (.txt, .csv, ...; see renderers) that belong to an export file."""
+    suffix = export_suffix(path) or os.path.splitext(path)[1]
+    base = path[:-len(suffix)] if suffix else path
+    return [base + s for s in RENDER_SUFFIXES.values()]
+
+
+def other_format_paths(path):
+    """Paths the export of path would have in the other export formats (same base name and directory)."""
+    suffix = export_suffix(path)
+    base = path[:-len(suffix)] if suffix else path
+    return [base + s for s in EXPORT_SUFFIXES if s != suffix]
+
+
+def temp_path(path):
+    """
+    Temporary path a file is written to before it is renamed to path: same directory (so the
+    rename is atomic) and suffix (so open_export compresses alike), hidden and not named like
+    an export, so index rebuilds and scans skip it.
+    """
+    directory, name = os.path.split(path)
+    return os.path.join(directory, TEMP_PREFIX + name)
+
+
+def open_export(path, mode='r'):
+    """Open an export file in text mode ('r' or 'w'), compressing by suffix."""
+    # the compressors are imported on first use: purge and delete-owner never open an export
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.xz'):
+        import lzma
+        return lzma.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def parse_header(f, ndjson=False):
+    """
+    Read the leading scalar fields of an export (everything before "tracks") from a
+    text stream without parsing the tracks. Returns a dict, or None if there is no header.
+    """
+    if ndjson:
+        line = f.readline()
+        return json.loads(line) if line.startswith('{') else None
+    lines = []
+    for line in f:
+        if line.startswith('  "tracks":'):
+            break
+        lines.append(line)
+    else:
+        return None
+    text = ''.join(lines).rstrip().rstrip(',')
+    return json.loads(text + '\n}') if text.startswith('{') else None
+
+
+def read_header(path):
+    """Header dict of an export file in any per-playlist format."""
+    with open_export(path) as f:
+        return parse_header(f, ndjson=path.endswith('.ndjson'))
+
+
+def _patch_in_place(path, expires_at, marker, stop):
+    """Overwrite the fixed-width expires_at value following marker, searching only before stop."""
+    new_value = expires_at.encode('utf-8')
+    with open(path, 'r+b') as f:
+        head = b''
+        while marker not in head:
+            chunk = f.read(4096)
+            if not chunk or stop in head:
+                return False
+            head += chunk
+        start = head.index(marker) + len(marker)
+        end = head.find(b'"', start)
+        if end == -1 or end - start != len(new_value):
+            return False
+        f.seek(start)
+        f.write(new_value)
+    return True
+
+
+def set_expires_at(path, expires_at):
+    """
+    Update the expires_at of an export. Timestamps are fixed-width, so plain json and
+    ndjson files are patched in place; compressed files are re-streamed through a
+    temp file. Returns True when the field was found and updated.
+    """
+    if path.endswith('.ndjson'):
+        return _patch_in_place(path, expires_at, _NDJSON_EXPIRES_MARKER, b'\n')
+    if not (path.endswith('.gz') or path.endswith('.xz')):
+        return _patch_in_place(path, expires_at, _JSON_EXPIRES_MARKER, b'\n  "tracks":')
+    base, ext = os.path.splitext(path)
+    tmp_path = base + '.tmp' + ext
+    found = False
+    try:
+        with open_export(path) as src, open_export(tmp_path, 'w') as dst:
+            for line in src:
+                if line.startswith('  "expires_at": '):
+                    line = f'  "expires_at": {json.dumps(expires_at)},\n'
+                    found = True
+                dst.write(line)
+                if found or line.startswith('  "tracks":'):
+                    break
+            shutil.copyfileobj(src, dst)
+        if found:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return found
+
+
+class RunArchive:
+    """
+    One zip archive collecting every playlist export of a run; safe to add to from several
+    threads. It is written under a temporary name and renamed to path on close.
+    """
+
+    def __init__(self, out_dir):
+        stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+        name = f"{ARCHIVE_PREFIX}{stamp}{ARCHIVE_SUFFIX}"
+        n = 1
+        while os.path.exists(os.path.join(out_dir, name)):
+            name = f"{ARCHIVE_PREFIX}{stamp}_{n}{ARCHIVE_SUFFIX}"
+            n += 1
+        self.name = name
+        self.path = os.path.join(out_dir, name)
+        self._zip = zipfile.ZipFile(temp_path(self.path), 'w', compression=zipfile.ZIP_DEFLATED)
+        self._lock = threading.Lock()
+
+    def spool(self):
+        """Temporary text file a member is written to before it is added to the archive."""
+        import tempfile
+        return tempfile.TemporaryFile('w+', encoding='utf-8')
+
+    def add(self, member, spool):
+        """Copy a finished spool file into the archive as member."""
+        spool.seek(0)
+        with self._lock:
+            with self._zip.open(member, 'w') as dst:
+                while True:
+                    chunk = spool.read(1 << 16)
+                    if not chunk:
+                        break
+                    dst.write(chunk.encode('utf-8'))
+
+    def close(self):
+        self._zip.close()
+        os.replace(temp_path(self.path), self.path)
+
+
+def archive_headers(path):
+    """Yield (member, header) for every playlist export in an archive."""
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if member.endswith('.json'):
+                with zf.open(member) as raw:
+                    header = parse_header(io.TextIOWrapper(raw, encoding='utf-8'))
+                if header:
+                    yield member, header
+
+
+def iter_export(path):
+    """(header, iterator of track entries) of a per-playlist export file in any format."""
+    if path.endswith('.ndjson'):
+        def tracks():
+            with open_export(path) as f:
+                f.readline()
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        return read_header(path), tracks()
+    with open_export(path) as f:
+        data = json.load(f)
+    tracks = data.pop('tracks', [])
+    return data, iter(tracks)
+
+
+def iter_archive_exports(path):
+    """Yield (member, header, track entries) for every playlist export in an archive."""
+    with zipfile.ZipFile(path) as zf:
+        for member in zf.namelist():
+            if member.endswith('.json'):
+                with zf.open(member) as raw:
+                    data = json.load(io.TextIOWrapper(raw, encoding='utf-8'))
+                if isinstance(data, dict) and data.get('playlist_id'):
+                    tracks = data.pop('tracks', [])
+                    yield member, data, tracks
+
+
+def remove_archive_members(path, members):
+    """
+    Remove export members (and their rendered siblings) from an archive by rewriting it;
+    the archive is deleted when nothing is left. Returns True if the archive was deleted.
+    """
+    drop = set(members) | {r for m in members for r in rendered_siblings(m)}
+    with zipfile.ZipFile(path) as zf:
+        keep = [info for info in zf.infolist() if info.filename not in drop]
+        if not keep:
+            os.remove(path)
+            return True
+        tmp_path = path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as out:
+            for info in keep:
+                with zf.open(info) as src, out.open(info.filename, 'w') as dst:
+                    shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, path)
+    return False
@@ -0,0 +1,183 @@
+"""
+SQLite index of the exports in an output directory (.export_index.sqlite).
+The export path records every written playlist (owner_id, expires_at, ...) so that
+purge and delete-owner can find matching files without opening every export.
+It is built from the export headers on first use; rebuild_index recreates it when
+it is stale (files added or removed by hand).
+"""
+import os
+import sqlite3
+
+INDEX_FILENAME = '.export_index.sqlite'
+
+# bump when the table changes; older indexes are dropped and rebuilt from the files
+SCHEMA_VERSION = 2
+_SCHEMA = (
+    """CREATE TABLE exports (
+        playlist_id TEXT NOT NULL,
+        json_file TEXT NOT NULL,
+        member TEXT NOT NULL DEFAULT '',
+        owner_id TEXT,
+        expires_at TEXT,
+        snapshot_id TEXT,
+        PRIMARY KEY (json_file, member)
+    )""",
+    "CREATE INDEX exports_expires_at ON exports (expires_at)",
+    "CREATE INDEX exports_owner_id ON exports (owner_id)",
+)
+
+
+def index_path(export_dir):
+    return os.path.join(export_dir, INDEX_FILENAME)
+
+
+def has_index(export_dir):
+    return os.path.exists(index_path(export_dir))
+
+
+_INSERT = ("INSERT OR REPLACE INTO exports (playlist_id, json_file, member, owner_id, expires_at, snapshot_id) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+
+
+def _connect(export_dir):
+    """
+    Open the index, creating (or upgrading) it from the export files if needed.
+    Each call gets its own connection, so it is thread-safe.
+    """
+    conn = sqlite3.connect(index_path(export_dir), timeout=30)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # take the write lock first so concurrent writers build the index only once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS exports")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                conn.executemany(_INSERT, _scan_rows(export_dir))
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            conn.close()
+            raise
+    return conn
+
+
+def _row(header, json_file, member=None):
+    return (header.get('playlist_id'), json_file, member or '', header.get('owner_id'), header.get('expires_at'),
+            header.get('snapshot_id'))
+
+
+def record_export(export_dir, header, json_file, member=None):
+    """
+    Insert or update the index entry of one export. json_file is the export file relative
+    to export_dir; for archive exports it is the archive and member the entry inside it
+    (the same playlist can be indexed once per file or archive).
+    """
+    try:
+        conn = _connect(export_dir)
+        try:
+            with conn:
+                conn.execute(_INSERT, _row(header, json_file, member))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print('Failed to update export index', index_path(export_dir), e)
+
+
+def expired_entries(export_dir, now_iso):
+    """Return (playlist_id, json_file, member) of exports whose expires_at is not after now_iso."""
+    conn = _connect(export_dir)
+    try:
+        return conn.execute("SELECT playlist_id, json_file, member FROM exports WHERE expires_at <= ?",
+                            (now_iso,)).fetchall()
+    finally:
+        conn.close()
+
+
+def owner_entries(export_dir, owner_id):
+    """Return (playlist_id, json_file, member) of exports belonging to owner_id."""
+    conn = _connect(export_dir)
+    try:
+        return conn.execute("SELECT playlist_id, json_file, member FROM exports WHERE owner_id = ?",
+                            (owner_id,)).fetchall()
+    finally:
+        conn.close()
+
+
+def file_entries(export_dir):
+    """Return (playlist_id, json_file, owner_id) of the per-playlist export files (archive members excluded)."""
+    conn = _connect(export_dir)
+    try:
+        return conn.execute("SELECT playlist_id, json_file, owner_id FROM exports WHERE member = ''").fetchall()
+    finally:
+        conn.close()
+
+
+def rename_entries(export_dir, moves):
+    """Point the entries of moved export files at their new path; moves are (json_file, new json_file)."""
+    if not moves:
+        return
+    conn = _connect(export_dir)
+    try:
+        with conn:
+            conn.executemany("UPDATE exports SET json_file = ? WHERE json_file = ? AND member = ''",
+                             [(new, old) for old, new in moves])
+    finally:
+        conn.close()
+
+
+def remove_entries(export_dir, keys):
+    """Drop the index entries of the given (json_file, member) keys."""
+    if not keys:
+        return
+    conn = _connect(export_dir)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM exports WHERE json_file = ? AND member = ?",
+                             [(json_file, member or '') for json_file, member in keys])
+    finally:
+        conn.close()
+
+
+def clear_index(export_dir):
+    """Remove the index file."""
+    try:
+        os.remove(index_path(export_dir))
+    except FileNotFoundError:
+        pass
+
+
+def _scan_rows(export_dir):
+    """Index rows read from the headers of the export files (every format, archives included)."""
+    # imported here: only index builds read the files
+    from export_formats import export_suffix, is_archive, read_header, archive_headers
+    from export_layout import iter_export_files
+    rows = []
+    for rel_path, fname in iter_export_files(export_dir):
+        path = os.path.join(export_dir, rel_path)
+        try:
+            if is_archive(fname):
+                for member, header in archive_headers(path):
+                    if header.get('playlist_id'):
+                        rows.append(_row(header, rel_path, member))
+                continue
+            if not (fname.startswith('playlist_') and export_suffix(fname)):
+                continue
+            header = read_header(path)
+        except Exception as e:
+            print('Failed to process', path, e)
+            continue
+        if header and header.get('playlist_id'):
+            rows.append(_row(header, rel_path))
+    return rows
+
+
+def rebuild_index(export_dir):
+    """Recreate the index from the headers of the export files. Returns the number of indexed exports."""
+    clear_index(export_dir)
+    conn = _connect(export_dir)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM exports").fetchone()[0]
+    finally:
+        conn.close()
@@ -1,28 +1,467 @@
 """
 Exports playlists and tracks to JSON using spotify_api and utils helpers.
-Writes one JSON file per playlist and optionally writes a plain-text (.txt)
-file next to each JSON containing "Title — Artist1, Artist2" lines.
+Writes one JSON file per playlist (or another format from export_formats, e.g.
+NDJSON, compressed JSON or one archive per run) and optionally renders human-readable
+files next to each export in the same pass (plain-text "Title [Artist1, Artist2]" lines,
+CSV, M3U, Markdown; see renderers).
+Track pages are streamed from the API straight into the output files.
 """
 import json
 import os
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 from utils import ms_to_hhmmss, now_iso_utc
-from spotify_api import paged_get
+from export_formats import export_filename, open_export, read_header, set_expires_at, temp_path, RunArchive
+from export_layout import export_relpath, use_layout
+from renderers import RenderedFiles, compile_renderers
+from export_index import record_export
+from search_index import TrackIndexer, clear_search_index
+from track_store import TrackStore, STORE_FILENAME
+from instrumentation import PlaylistTimer
+from checkpoint import Checkpoint
+from write_stage import WriteStage, InlineStage, PageQueue
+from spotify_api import paged_get, iter_pages, ensure_pool_size
 
 API_BASE = "https://api.spotify.com/v1"
 
+# `fields` filters for lean mode: only what slim_track / the playlist listing keep
+PLAYLIST_FIELDS = "items(id,name,owner(id),tracks(total),snapshot_id),next,total,limit,offset"
+TRACK_FIELDS = "items(track(id,name,duration_ms,artists(id,name))),next,total,limit,offset"
 
-def export_playlists_and_tracks(access_token, out_path, export_all=False, ttl_days=2, write_plain_files=False):
+_print_lock = threading.Lock()
+
+
+def _log(message):
+    """Print a message without interleaving output from concurrent workers."""
+    with _print_lock:
+        print(message)
+
+
+def item_track(item):
+    """The track object of a raw playlist item (None for empty slots)."""
+    return item.get('track') if isinstance(item, dict) and 'track' in item else item
+
+
+def slim_track(item):
+    """Reduce a raw playlist item to the exported track dict, or None for empty slots."""
+    track = item_track(item)
+    if not track:
+        return None
+    duration_ms = track.get('duration_ms')
+    return {
+        'track_id': track.get('id'),
+        'title': track.get('name'),
+        'artists': [a.get('name') for a in track.get('artists', []) or [] if a.get('name')],
+        'duration_ms': duration_ms,
+        'duration': ms_to_hhmmss(duration_ms)
+    }
+
+
+def resume_track(item):
+    """
+    The fields of a raw playlist item that slim_track and TrackStore.add read (those kept
+    by TRACK_FIELDS), as a track object; None for empty slots. Checkpoints keep pages in
+    this form, so a replayed page exports the same tracks at a fraction of the raw size.
+    """
+    track = item_track(item)
+    if not track:
+        return None
+    return {
+        'id': track.get('id'),
+        'name': track.get('name'),
+        'duration_ms': track.get('duration_ms'),
+        'artists': [{'id': a.get('id'), 'name': a.get('name')} for a in track.get('artists', []) or []]
+    }
+
+
+def tracks_request(playlist_id, lean=False, offset=0):
+    """URL and params of the playlist-tracks call (starting at offset)."""
+    params = {"limit": 100}
+    if lean:
+        params["fields"] = TRACK_FIELDS
+    if offset:
+        params["offset"] = offset
+    return f"{API_BASE}/playlists/{playlist_id}/tracks", params
+
+
+def iter_playlist_pages(playlist_id, access_token, page_workers=1, lean=False, offset=0):
+    """Yield the raw items of a playlist page by page as the pages arrive from the API."""
+    url, params = tracks_request(playlist_id, lean, offset)
+    return iter_pages(url, access_token, params=params, page_workers=page_workers)
+
+
+def reduce_items(items, store=None):
+    """
+    Reduce raw playlist items to (track dict, ref) pairs for PlaylistWriter.add; ref is the
+    track id when normalized (the track then goes into the store), else None.
+    """
+    entries = []
+    if store is None:
+        for item in items:
+            track = slim_track(item)
+            if track is not None:
+                entries.append((track, None))
+        return entries
+    for item in items:
+        track = item_track(item)
+        if track:
+            track_id, t = store.add(track)
+            entries.append((t, track_id))
+    return entries
+
+
+def checkpoint_pages(checkpoint, pl):
+    """
+    (saved pages, page log) of pl: the pages a resumed run replays and the PageLog the
+    writer persists every page to; ([], None) without a checkpoint.
+    """
+    if checkpoint is None:
+        return [], None
+    return checkpoint.saved_pages(pl), checkpoint.page_log(pl)
+
+
+def write_page(writer, items, store, timer, track_ids=None):
+    """
+    Reduce one page of raw items and append it to writer, charging the time to timer's
+    transform and write phases (runs on the write stage, see write_stage).
+    The track ids are added to the track_ids set, if given (collected for the enrichment stage).
+    With a page log, the page is checkpointed (reduced by resume_track) before it is written.
+    """
+    started = time.perf_counter()
+    if writer.page_log is not None:
+        writer.page_log.add([resume_track(item) for item in items])
+    entries = reduce_items(items, store)
+    if track_ids is not None:
+        track_ids.update(t['track_id'] for t, _ in entries if t.get('track_id'))
+    reduced = time.perf_counter()
+    timer.charge('transform', reduced - started)
+    for t, ref in entries:
+        writer.add(t, ref)
+    if writer.indexer is not None:
+        writer.indexer.add(t for t, _ in entries)
+    timer.charge('write', time.perf_counter() - reduced)
+
+
+class PlaylistWriter:
+    """
+    Streams one playlist export to disk in the requested format (see export_formats):
+    for json, {**header, "tracks": [...]} is written track by track and is byte-identical
+    to json.dump(..., ensure_ascii=False, indent=2), so header keys (total_tracks,
+    expires_at, ...) still come first; ndjson writes the header line, then one line per
+    track. The files of the renderers (compiled once per run, see renderers) are written
+    in the same pass. Files are written to a temporary name and renamed into place on a
+    successful close (and removed on failure), so readers never see a half-written export.
+    With an archive, all of them are spooled and added to the run archive on close.
+    Unless search_index is False, its tracks are staged in the search index page by page
+    (write_page); a complete close records the export in the export index and commits them.
+    A checkpoint's page_log is
+    opened and closed with the files (its pages are written by write_page).
+    Use as a context manager, or call open() and close() (the write stage does).
+    """
+
+    def __init__(self, out_dir, filename, header, renderers=(), fmt='json', archive=None, page_log=None,
+                 search_index=True):
+        self.out_dir = out_dir
+        self.filename = filename
+        self.header = header
+        self.fmt = fmt
+        self.archive = archive
+        self.file_path = archive.path if archive is not None else os.path.join(out_dir, filename)
+        self.rendered = RenderedFiles(renderers, os.path.dirname(self.file_path), header['playlist_id'], archive,
+                                      log=_log) \
+            if renderers else None
+        self.count = 0
+        self.page_log = page_log
+        self.indexer = None
+        if search_index:
+            self.indexer = TrackIndexer(out_dir, header, archive.name, filename) if archive is not None \
+                else TrackIndexer(out_dir, header, filename)
+        self._f = None
+        self._tmp_path = temp_path(self.file_path) if archive is None else None
+
+    def open(self):
+        if self.page_log is not None:
+            self.page_log.open()
+        if self.indexer is not None:
+            self.indexer.open()
+        if self.rendered is not None:
+            self.rendered.open(self.header)
+        self._f = self.archive.spool() if self.archive is not None else open_export(self._tmp_path, 'w')
+        if self.fmt == 'ndjson':
+            self._f.write(json.dumps(self.header, ensure_ascii=False, separators=(',', ':')) + "\n")
+            return self
+        self._f.write("{\n")
+        for key, value in self.header.items():
+            value_json = json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            self._f.write(f"  {json.dumps(key, ensure_ascii=False)}: {value_json},\n")
+        self._f.write('  "tracks": [')
+        return self
+
+    def add(self, t, ref=None):
+        """Append track dict t; a normalized export writes ref (the track id) in its place."""
+        entry = t if ref is None else ref
+        if self.fmt == 'ndjson':
+            self._f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+        else:
+            body = json.dumps(entry, ensure_ascii=False, indent=2).replace("\n", "\n    ")
+            self._f.write(("," if self.count else "") + "\n    " + body)
+        self.count += 1
+        if self.rendered is not None:
+            self.rendered.add(t)
+
+    def close(self, exc=None):
+        """
+        Finish the files and move them into place, or, with the exception that stopped the
+        export, discard them (an existing export of the playlist is left untouched).
+        """
+        complete = exc is None
+        try:
+            if complete:
+                if self.fmt != 'ndjson':
+                    self._f.write("\n  ]\n}" if self.count else "]\n}")
+                if self.archive is not None:
+                    self.archive.add(self.filename, self._f)
+        except BaseException:
+            complete = False
+            raise
+        finally:
+            if self.page_log is not None:
+                self.page_log.close()
+            if self._f is not None:
+                self._f.close()
+            if self._tmp_path is not None:
+                if complete:
+                    os.replace(self._tmp_path, self.file_path)
+                elif os.path.exists(self._tmp_path):
+                    os.remove(self._tmp_path)
+            if self.rendered is not None:
+                self.rendered.close(complete=complete)
+            if not complete and self.indexer is not None:
+                self.indexer.abort()
+        if not complete:
+            return
+        if self.archive is not None:
+            record_export(self.out_dir, self.header, self.archive.name, self.filename)
+        else:
+            record_export(self.out_dir, self.header, self.filename)
+        if self.indexer is not None:
+            self.indexer.commit()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc if exc_type is not None else None)
+        return False
+
+    def report(self):
+        """Print the per-file messages of the serial path."""
+        if self.archive is not None:
+            _log(f" -> added {self.filename} to {self.file_path} ({self.count} tracks)")
+            return
+        _log(f" -> wrote {self.file_path} ({self.count} tracks)")
+        for path in self.rendered.paths if self.rendered is not None else ():
+            _log(f" -> wrote {path}")
+
+
+def _is_unchanged(pl, file_path, rendered_paths=()):
+    """True if file_path is an export of the same playlist snapshot (and the rendered_paths exist)."""
+    if not pl.get('snapshot_id') or not os.path.exists(file_path):
+        return False
+    if not all(os.path.exists(p) for p in rendered_paths):
+        return False
+    try:
+        existing = read_header(file_path)
+    except Exception:
+        return False
+    return bool(existing) and existing.get('snapshot_id') == pl['snapshot_id']
+
+
+def prepare_playlist(pl, out_dir, *, ttl_days=2, renderers=(), quiet=False, incremental=False,
+                     fmt='json', archive=None, store=None, layout='flat', page_log=None, search_index=True):
+    """
+    Build the PlaylistWriter for one playlist export, or return None when incremental
+    mode finds the existing export unchanged (its expires_at is refreshed instead).
+    With a TrackStore, the header names the store the track ids refer to. In the sharded
+    layout (see export_layout) the files go to the playlist's shard directory. page_log
+    (see checkpoint) and search_index are handed to the writer.
+    Shared by the threaded and the async engines.
+    """
+    if not quiet:
+        _log(f"\nProcessing playlist: {pl['name']} (id={pl['id']}) — {pl['total_tracks']} tracks")
+
+    expires_at = (datetime.now(timezone.utc) + timedelta(days=int(ttl_days))).strftime('%Y-%m-%dT%H:%M:%SZ')
+    header = {
+        'playlist_id': pl['id'],
+        'playlist_name': pl['name'],
+        'owner_id': pl.get('owner_id'),
+        'total_tracks': pl['total_tracks'],
+        'expires_at': expires_at,
+        'snapshot_id': pl.get('snapshot_id')
+    }
+    if store is not None:
+        header['track_store'] = STORE_FILENAME
+
+    # per-playlist export file named by playlist id, optionally with rendered files alongside
+    filename = export_filename(pl['id'], fmt)
+    if archive is None:
+        filename = export_relpath(filename, pl.get('owner_id'), pl['id'], layout)
+    file_path = os.path.join(out_dir, filename)
+
+    if incremental and archive is None and _is_unchanged(
+            pl, file_path, [os.path.join(os.path.dirname(file_path), r.filename(pl['id'])) for r in renderers]):
+        if set_expires_at(file_path, expires_at):
+            record_export(out_dir, header, filename)
+            if not quiet:
+                _log(f" -> unchanged (snapshot {pl['snapshot_id']}), refreshed expires_at in {file_path}")
+            return None
+    if layout != 'flat' and archive is None:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    return PlaylistWriter(out_dir, filename, header, renderers, fmt=fmt, archive=archive, page_log=page_log,
+                          search_index=search_index)
+
+
+def finish_playlist(writer, pl, checkpoint, timer, quiet=False):
+    """Close a fully written playlist (files renamed into place) and record it; runs on the write stage."""
+    started = time.perf_counter()
+    writer.close()
+    timer.charge('write', time.perf_counter() - started)
+    if checkpoint is not None:
+        checkpoint.mark_completed(pl)
+    timer.finish(writer.count)
+    if not quiet:
+        writer.report()
+    return writer.count
+
+
+def _done(value):
+    """A future that is already resolved to value."""
+    return InlineStage().submit(lambda: value)
+
+
+def start_playlist(pl, access_token, out_dir, *, ttl_days=2, renderers=(), quiet=False,
+                   page_workers=1, incremental=False, lean=False, fmt='json', archive=None, store=None,
+                   checkpoint=None, track_ids=None, stage=None, layout='flat', search_index=True):
+    """
+    Fetch the tracks of one playlist and queue their writes on stage (a write_stage.WriteStage;
+    without one, every page is written before the next is fetched). Returns once the last
+    page is fetched, with a future of export_playlist's result that resolves when the files
+    are in place, so the next playlist can download while this one is written.
+    """
+    timer = PlaylistTimer(pl['id'])
+    if checkpoint is not None and checkpoint.is_completed(pl):
+        if not quiet:
+            _log(" -> already exported by the interrupted run, skipped")
+        timer.finish(None)
+        return _done(None)
+    saved, page_log = checkpoint_pages(checkpoint, pl)
+    writer = prepare_playlist(pl, out_dir, ttl_days=ttl_days, renderers=renderers, quiet=quiet,
+                              incremental=incremental, fmt=fmt, archive=archive, store=store, layout=layout,
+                              page_log=page_log, search_index=search_index)
+    if writer is None:
+        if checkpoint is not None:
+            checkpoint.mark_completed(pl)
+        timer.finish(None)
+        return _done(None)
+    pages = PageQueue(stage if stage is not None else InlineStage())
+    pages.put(writer.open)
+    try:
+        offset = 0
+        for page in saved:
+            pages.put(write_page, writer, page, store, timer, track_ids)
+            offset += len(page)
+        timer.mark()
+        for page in iter_playlist_pages(pl['id'], access_token, page_workers, lean, offset):
+            timer.lap('fetch')
+            pages.put(write_page, writer, page, store, timer, track_ids)
+            timer.mark()
+    except BaseException as e:
+        pages.abort(writer.close, e)
+        raise
+    return pages.close(lambda: finish_playlist(writer, pl, checkpoint, timer, quiet), writer.close)
+
+
+def export_playlist(pl, access_token, out_dir, *, ttl_days=2, renderers=(), quiet=False,
+                    page_workers=1, incremental=False, lean=False, fmt='json', archive=None, store=None,
+                    checkpoint=None, track_ids=None, stage=None, layout='flat', search_index=True):
+    """
+    Fetch the tracks of one playlist and write playlist_<id>.<fmt> (and the files of the
+    renderers, e.g. .txt) into out_dir.
+    Pages are reduced to slim track dicts and streamed straight into the files as they
+    arrive, so memory stays flat regardless of playlist size; with a write stage, pages are
+    written on its writer thread while the next ones download.
+    Returns the number of tracks written. With quiet=True the per-file messages are
+    suppressed (used by the concurrent path, which reports progress per playlist).
+    page_workers > 1 fetches the playlist's track pages concurrently.
+    With incremental=True, a playlist whose snapshot_id matches the existing export is
+    not fetched again; only its expires_at is refreshed and None is returned.
+    lean=True asks the API only for the track fields that are exported.
+    fmt selects the file format (see export_formats); archive exports go into `archive`.
+    With a TrackStore (normalized mode), tracks go into the store and the export lists track ids.
+    With a Checkpoint, fetched pages are persisted as they arrive and the playlist is recorded
+    once written; playlists completed by the checkpointed run are skipped (None is returned)
+    and a partly fetched one continues after its saved pages.
+    The ids of the written tracks are added to the track_ids set, if given.
+    layout is the directory layout the files are written in (see export_layout).
+    search_index=False leaves the tracks out of the search index.
+    """
+    return start_playlist(pl, access_token, out_dir, ttl_days=ttl_days, renderers=renderers, quiet=quiet,
+                          page_workers=page_workers, incremental=incremental, lean=lean, fmt=fmt, archive=archive,
+                          store=store, checkpoint=checkpoint, track_ids=track_ids, stage=stage,
+                          layout=layout, search_index=search_index).result()
+
+
+def export_playlists_and_tracks(access_token, out_path, *, export_all=False, ttl_days=2, write_plain_files=False,
+                                workers=1, page_workers=1, incremental=False, lean=False, engine='threads',
+                                fmt='json', normalized=False, playlist_ids=None, stop_event=None,
+                                executor=None, resume=False, metadata_cache=None, render=(), layout=None,
+                                search_index=True):
     """
     Retrieve playlists and tracks and write per-playlist JSON files into the output directory.
-    If write_plain_files=True, also create playlist_<playlist_id>.txt alongside the JSON..
+    access_token is an access token string or a token_manager.TokenManager (refreshed mid-export).
+    If write_plain_files=True, also create playlist_<playlist_id>.txt alongside the JSON.
+    render lists further formats rendered next to each export in the same pass
+    (renderers.RENDER_FORMATS: txt, csv, m3u, md).
+    With workers > 1, playlists are fetched and written concurrently over a shared session;
+    page_workers > 1 additionally fetches the pages of each playlist concurrently.
+    With incremental=True, playlists whose snapshot_id is unchanged since the last export
+    are skipped and only have their expires_at refreshed.
+    lean=True uses `fields` filters so the API returns only the fields that are exported.
+    engine='async' runs the per-playlist exports as coroutines on an event loop (see
+    export_async), with workers as the number of playlists in flight.
+    fmt is one of export_formats.FORMATS; 'archive' collects the whole run in one zip file.
+    normalized=True stores each distinct track once in track_store.json and writes
+    playlists as lists of track ids.
+    playlist_ids selects the playlists to export without prompting (used by daemon mode to
+    re-sync the first cycle's selection). Once stop_event (a threading.Event) is set, no
+    further playlists are started; the ones in progress are finished.
+    executor is a ThreadPoolExecutor shared with other exports (batch mode); the threaded
+    path submits to it instead of creating its own pool of `workers` threads.
+    The run is checkpointed in the output directory (see checkpoint); resume=True continues
+    an interrupted run with the same options instead of starting from the first playlist.
+    With a metadata_cache (metadata_cache.MetadataCache), the tracks of the run are enriched
+    after the track loop with album, release date, ISRC and genres (see enrichment).
+    layout ('flat' or 'sharded', see export_layout) is recorded for the output directory;
+    None keeps the directory's layout. Changing the layout of a directory that already
+    has exports raises ValueError (migrate it first).
+    search_index=False skips the search index (see search_index) and drops the directory's
+    existing one, so it cannot go stale; the search command rebuilds it from the files.
+    Returns the list of selected playlists, or None when nothing was selected.
     """
     out_dir = out_path if os.path.isdir(out_path) else os.path.dirname(out_path) or 'exports'
     if not os.path.exists(out_dir):
         os.makedirs(out_dir, exist_ok=True)
+    layout = use_layout(out_dir, layout)
 
     print("Fetching playlists...")
-    playlists_raw = paged_get(f"{API_BASE}/me/playlists", access_token, params={"limit": 50})
+    params = {"limit": 50}
+    if lean:
+        params["fields"] = PLAYLIST_FIELDS
+    playlists_raw = paged_get(f"{API_BASE}/me/playlists", access_token, params=params)
     playlists = []
     for p in playlists_raw:
         playlist_id = p.get('id')
@@ -33,7 +472,8 @@ def export_playlists_and_tracks(access_token, out_path, export_all=False, ttl_da
             'id': playlist_id,
             'name': name,
             'owner_id': owner_id,
-            'total_tracks': total
+            'total_tracks': total,
+            'snapshot_id': p.get('snapshot_id')
         })
 
     if not playlists:
@@ -41,7 +481,10 @@ def export_playlists_and_tracks(access_token, out_path, export_all=False, ttl_da
         return None
 
     selected = playlists if export_all else []
-    if not export_all:
+    if playlist_ids is not None and not export_all:
+        wanted = set(playlist_ids)
+        selected = [pl for pl in playlists if pl['id'] in wanted]
+    elif not export_all:
         print('\nPlaylists found:')
         for idx, pl in enumerate(playlists):
             print(f"[{idx}] {pl['name']} (tracks: {pl['total_tracks']})")
@@ -58,67 +501,100 @@ def export_playlists_and_tracks(access_token, out_path, export_all=False, ttl_da
                 print('Invalid selection — aborting.')
                 return None
 
-    for pl in selected:
-        print(f"\nProcessing playlist: {pl['name']} (id={pl['id']}) — {pl['total_tracks']} tracks")
-        tracks_items = paged_get(f"{API_BASE}/playlists/{pl['id']}/tracks", access_token, params={"limit": 100})
-        tracks_out = []
-        for item in tracks_items:
-            track = item.get('track') if isinstance(item, dict) and 'track' in item else item
-            if not track:
-                continue
-            track_id = track.get('id')
-            title = track.get('name')
-            artists = [a.get('name') for a in track.get('artists', []) or [] if a.get('name')]
-            duration_ms = track.get('duration_ms')
-            tracks_out.append({
-                'track_id': track_id,
-                'title': title,
-                'artists': artists,
-                'duration_ms': duration_ms,
-                'duration': ms_to_hhmmss(duration_ms)
-            })
-
-        expires_at = (datetime.now(timezone.utc) + timedelta(days=int(ttl_days))).strftime('%Y-%m-%dT%H:%M:%SZ')
-        playlist_output = {
-            'playlist_id': pl['id'],
-            'playlist_name': pl['name'],
-            'owner_id': pl.get('owner_id'),
-            'total_tracks': pl['total_tracks'],
-            'expires_at': expires_at,
-            'tracks': tracks_out
-        }
-
-        # write per-playlist JSON file named by playlist id
-        filename = f"playlist_{pl['id']}.json"
-        file_path = os.path.join(out_dir, filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(playlist_output, f, ensure_ascii=False, indent=2)
-        print(f" -> wrote {file_path} ({len(tracks_out)} tracks)")
-
-        # optionally write plain-text file alongside the JSON file
-        if write_plain_files:
-            txt_lines = []
-            for t in tracks_out:
-                title = t.get('title') or "<unknown title>"
-                artists = t.get('artists') or []
-                # ensure artists are strings
-                artists_clean = []
-                for a in artists:
-                    if isinstance(a, str):
-                        artists_clean.append(a)
-                    elif isinstance(a, dict):
-                        name = a.get('name')
-                        if name:
-                            artists_clean.append(name)
-                artists_str = ", ".join(artists_clean) if artists_clean else "Unknown artist"
-                txt_lines.append(f"{title} [{artists_str}]")
-            txt_filename = f"playlist_{pl['id']}.txt"
-            txt_path = os.path.join(out_dir, txt_filename)
-            try:
-                with open(txt_path, 'w', encoding='utf-8') as tf:
-                    tf.write("\n".join(txt_lines) + ("\n" if txt_lines else ""))
-                print(f" -> wrote plain text {txt_path}")
-            except Exception as e:
-                print(f"Failed to write plain text file {txt_path}: {e}")
+    ensure_pool_size(max(1, workers or 1) * max(1, page_workers or 1))
+
+    if incremental and fmt == 'archive':
+        print('Note: --incremental does not apply to the archive format; every playlist is exported.')
+    formats = (['txt'] if write_plain_files else []) + list(render or ())
+    options = dict(ttl_days=ttl_days, renderers=compile_renderers(formats), page_workers=page_workers,
+                   incremental=incremental, lean=lean, fmt=fmt, layout=layout, search_index=search_index)
+    if not search_index:
+        clear_search_index(out_dir)
+    archive = RunArchive(out_dir) if fmt == 'archive' else None
+    store = TrackStore(out_dir) if normalized else None
+    if store is not None:
+        options['store'] = store
+    checkpoint = Checkpoint(out_dir, dict(fmt=fmt, normalized=normalized, lean=lean, layout=layout,
+                                          render=[r.name for r in options['renderers']]), resume=resume)
+    options['checkpoint'] = checkpoint
+    # files are written on writer threads while the next pages download; concurrent runs get
+    # several writers (one per playlist in flight, up to the CPU count) so compression can overlap
+    concurrent = engine == 'async' or executor is not None or (workers and workers > 1)
+    stage = WriteStage(writers=min(max(1, workers or 1), os.cpu_count() or 1) if concurrent else 1)
+    options['stage'] = stage
+    if metadata_cache is not None:
+        options['track_ids'] = set()
+    try:
+        if engine == 'async':
+            # imported lazily: aiohttp is an optional dependency
+            import asyncio
+            from export_async import export_selected_async
+            asyncio.run(export_selected_async(selected, access_token, out_dir, concurrency=workers, archive=archive,
+                                              stop_event=stop_event, **options))
+        elif executor is not None or (workers and workers > 1):
+            total = len(selected)
+            print(f"\nExporting {total} playlists with {workers} workers...")
+            # a shared executor (batch mode) is owned by the caller and stays open
+            with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(export_playlist, pl, access_token, out_dir, quiet=True, archive=archive,
+                                **options): pl
+                    for pl in selected
+                }
+                for done, fut in enumerate(as_completed(futures), start=1):
+                    pl = futures[fut]
+                    if stop_event is not None and stop_event.is_set():
+                        for pending in futures:
+                            pending.cancel()
+                    if fut.cancelled():
+                        continue
+                    try:
+                        count = fut.result()
+                        status = "unchanged" if count is None else f"{count} tracks"
+                        _log(f"[{done}/{total}] {pl['name']} (id={pl['id']}) — {status}")
+                    except Exception as e:
+                        _log(f"[{done}/{total}] {pl['name']} (id={pl['id']}) failed: {e}")
+                        # stop scheduling the remaining playlists, same as the serial path aborting
+                        for pending in futures:
+                            pending.cancel()
+                        raise
+        else:
+            # the next playlist downloads while the previous one is still being written
+            pending = []
+            for pl in selected:
+                if stop_event is not None and stop_event.is_set():
+                    print('Stopping: remaining playlists are skipped.')
+                    break
+                pending.append(start_playlist(pl, access_token, out_dir, archive=archive, **options))
+                # a failed write stops the run like a failed fetch
+                for fut in [f for f in pending if f.done()]:
+                    pending.remove(fut)
+                    fut.result()
+            for fut in pending:
+                fut.result()
+    except Exception:
+        print('Progress is checkpointed; run again with --resume to continue where this run stopped.')
+        raise
+    finally:
+        stage.close()
+        if archive is not None:
+            archive.close()
+            print(f"\nArchive written: {archive.path}")
+        if store is not None:
+            store.save()
+            print(f"Track store written: {store.path} ({len(store.tracks)} tracks, {len(store.artists)} artists)")
 
+    if stop_event is not None and stop_event.is_set():
+        print('Export stopped; run again with --resume to continue where it stopped.')
+        return selected
+    if metadata_cache is not None:
+        from enrichment import enrich_tracks
+        try:
+            enrich_tracks(options['track_ids'], access_token, out_dir, metadata_cache, API_BASE,
+                          workers=max(1, workers or 1))
+        except Exception as e:
+            # the exports are complete; only the metadata sidecar is missing
+            print(f"Enrichment failed: {e}")
+    checkpoint.finish()
     print(f"\nExport completed.")
+    return selected
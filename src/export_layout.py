@@ -0,0 +1,210 @@
+"""
+Layout of the per-playlist exports in an output directory:
+  flat     playlist_<id>.<ext> (and its rendered files) directly in the output directory
+  sharded  shards/<owner_id>/<xx>/playlist_<id>.<ext>, xx being the first hex digits of a
+           hash of the playlist id, so no directory grows past a few hundred files
+The layout of a directory is recorded in .export_layout (no file means flat) and changed
+with migrate_layout; run archives and the index / store files stay at the top level.
+The indexes key exports by their path relative to the output directory, so purge and
+delete-owner find sharded files without listing directories; scans (index rebuilds,
+render, purge-all) walk the top level and the shard tree with os.scandir.
+"""
+import os
+import re
+
+LAYOUTS = ('flat', 'sharded')
+LAYOUT_FILENAME = '.export_layout'
+SHARD_ROOT = 'shards'
+SHARD_HASH_DIGITS = 2
+
+
+def layout_path(export_dir):
+    return os.path.join(export_dir, LAYOUT_FILENAME)
+
+
+def read_layout(export_dir):
+    """The layout recorded for export_dir ('flat' when none is)."""
+    try:
+        with open(layout_path(export_dir), 'r', encoding='utf-8') as f:
+            layout = f.read().strip()
+    except FileNotFoundError:
+        return 'flat'
+    return layout if layout in LAYOUTS else 'flat'
+
+
+def write_layout(export_dir, layout):
+    if layout == 'flat':
+        try:
+            os.remove(layout_path(export_dir))
+        except FileNotFoundError:
+            pass
+        return
+    with open(layout_path(export_dir), 'w', encoding='utf-8') as f:
+        f.write(layout + "\n")
+
+
+def _safe_name(name):
+    """owner_id as a directory name (characters other than letters, digits, '.', '_' and '-' replaced)."""
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', name or '')
+    return name if name.strip('.') else '_' + name
+
+
+def shard_dir(owner_id, playlist_id):
+    """Directory of a playlist's files in the sharded layout, relative to the output directory."""
+    import hashlib
+    digest = hashlib.sha1(playlist_id.encode('utf-8')).hexdigest()[:SHARD_HASH_DIGITS]
+    return os.path.join(SHARD_ROOT, _safe_name(owner_id), digest)
+
+
+def export_relpath(filename, owner_id, playlist_id, layout='flat'):
+    """Path of an export file (or rendered file) relative to the output directory."""
+    if layout == 'sharded':
+        return os.path.join(shard_dir(owner_id, playlist_id), filename)
+    return filename
+
+
+def _has_exports(export_dir, layout):
+    """True if export_dir holds per-playlist exports written in layout."""
+    from export_formats import export_suffix
+    if layout == 'sharded':
+        return any(True for _ in iter_shard_dirs(export_dir))
+    with os.scandir(export_dir) as it:
+        return any(e.name.startswith('playlist_') and export_suffix(e.name) for e in it)
+
+
+def use_layout(export_dir, layout=None):
+    """
+    The layout exports into export_dir are written in: layout if given (recorded for the
+    directory), else the directory's recorded one. Raises ValueError when layout differs
+    from the recorded one and the directory already has exports (see migrate_layout).
+    """
+    current = read_layout(export_dir)
+    if layout is None or layout == current:
+        return current
+    if _has_exports(export_dir, current):
+        raise ValueError(f"{export_dir} holds {current} exports; run `migrate-layout --layout {layout}` first")
+    write_layout(export_dir, layout)
+    return layout
+
+
+def _subdirs(path):
+    try:
+        with os.scandir(path) as it:
+            return [e.path for e in it if e.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+
+def iter_shard_dirs(export_dir):
+    """Paths of the shard directories (shards/<owner>/<xx>) of export_dir."""
+    for owner in _subdirs(os.path.join(export_dir, SHARD_ROOT)):
+        yield from _subdirs(owner)
+
+
+def iter_export_files(export_dir):
+    """
+    Yield (path relative to export_dir, file name) of the files at the top level of
+    export_dir and in its shard directories, via os.scandir (no stat per entry).
+    """
+    with os.scandir(export_dir) as it:
+        entries = [e.name for e in it if e.is_file()]
+    for name in entries:
+        yield name, name
+    for shard in iter_shard_dirs(export_dir):
+        rel = os.path.relpath(shard, export_dir)
+        with os.scandir(shard) as it:
+            entries = [e.name for e in it if e.is_file()]
+        for name in entries:
+            yield os.path.join(rel, name), name
+
+
+def scan_dirs(export_dir):
+    """export_dir and its shard directories: the units purge-all works through in parallel."""
+    return [export_dir] + list(iter_shard_dirs(export_dir))
+
+
+def prune_shard_dirs(export_dir):
+    """Remove the empty shard and owner directories (and the shard root once empty)."""
+    root = os.path.join(export_dir, SHARD_ROOT)
+    for owner in _subdirs(root):
+        for directory in _subdirs(owner) + [owner]:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+    try:
+        os.rmdir(root)
+    except OSError:
+        pass
+
+
+def remove_empty_dirs(export_dir, rel_dirs):
+    """Remove the given directories (relative to export_dir) and their parents up to export_dir, while empty."""
+    for rel_dir in rel_dirs:
+        while rel_dir:
+            try:
+                os.rmdir(os.path.join(export_dir, rel_dir))
+            except OSError:
+                break
+            rel_dir = os.path.dirname(rel_dir)
+
+
+def in_parallel(fn, items, workers):
+    """fn(item) for every item, on up to `workers` threads when there is more than one item."""
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            fn(item)
+        return
+    # imported here: most maintenance runs only touch one directory
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        for _ in pool.map(fn, items):
+            pass
+
+
+def migrate_layout(export_dir, layout, workers=8):
+    """
+    Move the per-playlist exports of export_dir (and their rendered files) into layout,
+    `workers` moves at a time, and update the export and search indexes in place (no
+    export file is opened). Run archives are left where they are. The layout is recorded
+    once every file is moved, so an interrupted migration can simply be run again.
+    Returns the number of moved exports.
+    """
+    from export_formats import rendered_siblings
+    from export_index import file_entries, rename_entries
+    from search_index import rename_search_entries
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}' (choose from {', '.join(LAYOUTS)})")
+    moves = []
+    for playlist_id, json_file, owner_id in file_entries(export_dir):
+        target = export_relpath(os.path.basename(json_file), owner_id, playlist_id, layout)
+        if target != json_file:
+            moves.append((json_file, target))
+
+    moved = []
+
+    def move(entry):
+        json_file, target = entry
+        src, dst = os.path.join(export_dir, json_file), os.path.join(export_dir, target)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.replace(src, dst)
+        except FileNotFoundError:
+            print('Missing export (run rebuild-index):', src)
+            return
+        moved.append(entry)
+        for sibling, sibling_target in zip(rendered_siblings(src), rendered_siblings(dst)):
+            try:
+                os.replace(sibling, sibling_target)
+            except FileNotFoundError:
+                pass
+
+    try:
+        in_parallel(move, moves, workers)
+    finally:
+        rename_entries(export_dir, moved)
+        rename_search_entries(export_dir, moved)
+        prune_shard_dirs(export_dir)
+    write_layout(export_dir, layout)
+    return len(moved)
@@ -0,0 +1,136 @@
+"""
+Persistent on-disk cache for Spotify API GET responses.
+Entries are keyed by URL + query params and store the decoded body together with
+the ETag validator, so stale entries can be revalidated with If-None-Match (304).
+Responses of the /me endpoints depend on the user the token belongs to, so their keys
+also carry an account id (see spotify_api.cache_account): accounts sharing the cache
+(batch mode, or reconnecting as another user) never see each other's entries.
+The cache has a freshness TTL and a total size cap enforced by LRU eviction
+(file mtime is bumped on every hit).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+from utils import loads_json
+
+# per-user cache directory, outside the working tree: entries hold full response bodies,
+# private playlists included, and must not end up next to (or committed with) the code
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                                 'spotify-to-text')
+DEFAULT_TTL_SECONDS = 0
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def is_user_scoped(url):
+    """True for the /me endpoints, whose responses depend on the user the token belongs to."""
+    return '/me/' in urlsplit(url).path + '/'
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of JSON responses stored as one file per entry."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # path -> (size, last_used); rebuilt from the directory on startup
+        self._entries = {}
+        for fname in os.listdir(directory):
+            if fname.endswith('.json'):
+                path = os.path.join(directory, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._entries[path] = (st.st_size, st.st_mtime)
+        self._total = sum(size for size, _ in self._entries.values())
+
+    @staticmethod
+    def key(url, params=None, account=None):
+        """Stable cache key for a GET request; user-scoped URLs are prefixed with account."""
+        query = urlencode(sorted((params or {}).items()), doseq=True)
+        key = f"{url}?{query}" if query else url
+        return f"{account}|{key}" if account and is_user_scoped(url) else key
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        """Return the cached entry dict ({key, etag, stored_at, body}) or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = loads_json(f.read())
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        self._touch(path)
+        return entry
+
+    def is_fresh(self, entry):
+        """True if the entry is younger than the TTL and can be served without a request."""
+        return self.ttl > 0 and time.time() - entry.get('stored_at', 0) < self.ttl
+
+    def revalidated(self, key, entry):
+        """Record a 304 for entry: restart its TTL and keep serving the cached body."""
+        entry['stored_at'] = time.time()
+        self._write(key, entry)
+        return entry['body']
+
+    def put(self, key, etag, body):
+        """Store a response body (only useful with a validator or a positive TTL)."""
+        if not etag and self.ttl <= 0:
+            return
+        self._write(key, {'key': key, 'etag': etag, 'stored_at': time.time(), 'body': body})
+
+    def _write(self, key, entry):
+        path = self._path(key)
+        data = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if len(data) > self.max_bytes:
+            return
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print('Failed to write cache entry', path, e)
+            return
+        with self._lock:
+            old_size, _ = self._entries.get(path, (0, 0))
+            self._entries[path] = (len(data), time.time())
+            self._total += len(data) - old_size
+            self._evict()
+
+    def _touch(self, path):
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            return
+        with self._lock:
+            if path in self._entries:
+                self._entries[path] = (self._entries[path][0], now)
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes (lock held)."""
+        if self._total <= self.max_bytes:
+            return
+        for path, (size, _) in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print('Failed to evict cache entry', path, e)
+                continue
+            del self._entries[path]
+            self._total -= size
@@ -0,0 +1,172 @@
+"""
+Instrumentation hooks for exports.
+spotify_get (and the async client) report one 'request' event per API call: URL
+template, latency, final status, bytes, retries, time spent waiting on the rate
+limiter and on retry backoff. The export loop reports one 'playlist' event per
+playlist with the time spent fetching, transforming and writing it.
+Listeners registered with add_listener receive every event as a dict; ExportStats
+aggregates them into the --stats table and TraceWriter streams them to an NDJSON
+file (--trace). Without listeners, events are dropped right away.
+"""
+import json
+import math
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+# path segments following these collections are ids and are replaced by {id}
+_ID_COLLECTIONS = {'playlists', 'users', 'albums', 'artists', 'tracks', 'shows', 'episodes', 'audiobooks'}
+_VERSION_PREFIX = re.compile(r'^/v\d+')
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener):
+    """Call listener(event) for every instrumentation event."""
+    with _listeners_lock:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def emit(event):
+    """Hand an event dict to every listener (a no-op without listeners)."""
+    if not _listeners:
+        return
+    event.setdefault('ts', time.time())
+    for listener in list(_listeners):
+        listener(event)
+
+
+def url_template(url):
+    """Endpoint of a request URL with ids replaced, e.g. /playlists/{id}/tracks."""
+    segments = _VERSION_PREFIX.sub('', urlparse(url).path).strip('/').split('/')
+    out = []
+    for i, segment in enumerate(segments):
+        if i and segments[i - 1] in _ID_COLLECTIONS and segment not in _ID_COLLECTIONS:
+            segment = '{id}'
+        out.append(segment)
+    return '/' + '/'.join(out)
+
+
+def request_event(url):
+    """Fresh 'request' event, filled in by the HTTP layer while the call runs."""
+    return {'event': 'request', 'url': url_template(url), 'status': None, 'latency_s': 0.0, 'bytes': 0,
+            'retries': 0, 'rate_limit_wait_s': 0.0, 'backoff_s': 0.0, 'cache': None}
+
+
+class PlaylistTimer:
+    """Splits the wall time of one playlist export into fetch, transform and write phases."""
+
+    def __init__(self, playlist_id):
+        self.playlist_id = playlist_id
+        self.phases = {'fetch': 0.0, 'transform': 0.0, 'write': 0.0}
+        self._started = self._mark = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the previous lap to phase."""
+        now = time.perf_counter()
+        self.phases[phase] += now - self._mark
+        self._mark = now
+
+    def mark(self):
+        """Start the next lap now without charging the time since the previous one."""
+        self._mark = time.perf_counter()
+
+    def charge(self, phase, seconds):
+        """Add seconds measured elsewhere (e.g. on the writer thread) to phase."""
+        self.phases[phase] += seconds
+
+    def finish(self, tracks):
+        """Emit the 'playlist' event (tracks is None for playlists skipped as unchanged)."""
+        emit({'event': 'playlist', 'playlist_id': self.playlist_id, 'tracks': tracks,
+              'total_s': time.perf_counter() - self._started,
+              **{f"{phase}_s": seconds for phase, seconds in self.phases.items()}})
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list: its ceil(pct% of n)-th value (0 for an empty list)."""
+    if not values:
+        return 0.0
+    # pct * n / 100 rather than pct / 100 * n, which is off by one ulp for pct like 7
+    rank = max(0, min(len(values) - 1, math.ceil(pct * len(values) / 100) - 1))
+    return values[rank]
+
+
+class ExportStats:
+    """Listener aggregating request and playlist events per endpoint for the --stats table."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.playlists = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event['event'] == 'request':
+                ep = self.endpoints.setdefault(event['url'], {
+                    'calls': 0, 'errors': 0, 'cached': 0, 'retries': 0, 'bytes': 0,
+                    'rate_limit_wait_s': 0.0, 'backoff_s': 0.0, 'latencies': []})
+                ep['calls'] += 1
+                ep['errors'] += 1 if event.get('error') or (event['status'] or 0) >= 400 else 0
+                ep['cached'] += 1 if event['cache'] else 0
+                ep['retries'] += event['retries']
+                ep['bytes'] += event['bytes']
+                ep['rate_limit_wait_s'] += event['rate_limit_wait_s']
+                ep['backoff_s'] += event['backoff_s']
+                ep['latencies'].append(event['latency_s'])
+            elif event['event'] == 'playlist':
+                self.playlists.append(event)
+
+    def summary(self):
+        """The summary table as a string."""
+        lines = [f"{'endpoint':<28} {'calls':>6} {'errors':>6} {'cached':>6} {'retries':>7} {'MB':>8} "
+                 f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'rl wait s':>9} {'backoff s':>9}"]
+        with self._lock:
+            for url, ep in sorted(self.endpoints.items()):
+                latencies = sorted(ep['latencies'])
+                lines.append(
+                    f"{url:<28} {ep['calls']:>6} {ep['errors']:>6} {ep['cached']:>6} {ep['retries']:>7} "
+                    f"{ep['bytes'] / (1024 * 1024):>8.2f} {percentile(latencies, 50) * 1000:>8.1f} "
+                    f"{percentile(latencies, 95) * 1000:>8.1f} {latencies[-1] * 1000 if latencies else 0:>8.1f} "
+                    f"{ep['rate_limit_wait_s']:>9.2f} {ep['backoff_s']:>9.2f}")
+            exported = [p for p in self.playlists if p['tracks'] is not None]
+            tracks = sum(p['tracks'] for p in exported)
+            lines.append("")
+            lines.append(f"Playlists: {len(exported)} exported ({tracks} tracks), "
+                         f"{len(self.playlists) - len(exported)} unchanged; "
+                         f"wall time {time.perf_counter() - self.started:.2f}s")
+            if exported:
+                lines.append("Per-playlist time (summed): " + ", ".join(
+                    f"{phase} {sum(p[f'{phase}_s'] for p in exported):.2f}s"
+                    for phase in ('fetch', 'transform', 'write')))
+                slowest = max(exported, key=lambda p: p['total_s'])
+                lines.append(f"Slowest playlist: {slowest['playlist_id']} ({slowest['tracks']} tracks, "
+                             f"{slowest['total_s']:.2f}s)")
+        return "\n".join(lines)
+
+
+class TraceWriter:
+    """Listener writing every event as one JSON line to path (the --trace file)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if not self._f.closed:
+                self._f.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._f.close()
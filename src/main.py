@@ -1,20 +1,31 @@
 #!/usr/bin/env python3
 """
-CLI entrypoint. It wires together env, auth, token refresh and calls export_json. Provides --plain-files which writes plain text files (playlist_<id>.txt) next to each JSON export
-Also provides --purge, --purge-all, --delete-owner, --disconnect and --clear-env utilities to manage stored exports and env.
+CLI entrypoint. It wires together env, auth, token refresh and calls export_json.
+Subcommands: export (the default) writes per-playlist exports (--plain-files adds playlist_<id>.txt
+next to each JSON, --render adds CSV / M3U / Markdown files; --daemon keeps running and re-syncs on
+an --interval; --accounts exports several accounts in one process); render writes those files from
+existing exports without the API; search looks tracks and artists up in the search index of the
+exports; purge, purge-all, delete-owner, rebuild-index and migrate-layout manage stored exports; disconnect and clear-env manage the .env.
+Each subcommand imports only the modules it needs, so the maintenance commands (run often from
+cron) do not pay for requests, the auth flow or python-dotenv. The old flag spellings
+(--purge, --delete-owner ID, ...) are still accepted.
 """
 import os
 import sys
 import argparse
-from dotenv import load_dotenv
 
-from env_utils import save_to_env, ENV_PATH, ensure_env_file, remove_env_key
-from auth import authorization_code_flow, refresh_token_flow
-from export_json import export_playlists_and_tracks
-from purge_utils import purge_expired_exports, delete_exports_for_owner, purge_all_exports
+COMMANDS = ('export', 'render', 'search', 'purge', 'purge-all', 'delete-owner', 'rebuild-index',
+            'migrate-layout', 'disconnect', 'clear-env')
 
-# Load environment
-load_dotenv()
+# pre-subcommand flags, in the order the old CLI checked them
+LEGACY_FLAGS = (
+    ('--purge', 'purge'),
+    ('--rebuild-index', 'rebuild-index'),
+    ('--delete-owner', 'delete-owner'),
+    ('--purge-all', 'purge-all'),
+    ('--disconnect', 'disconnect'),
+    ('--clear-env', 'clear-env'),
+)
 
 
 def confirm_prompt(message):
@@ -25,72 +36,337 @@ def confirm_prompt(message):
     return resp in ('y', 'yes')
 
 
-def main():
+def render_formats(value):
+    """argparse type of --render / --formats: comma-separated render format names."""
+    from export_formats import RENDER_SUFFIXES
+    formats = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in formats if name not in RENDER_SUFFIXES]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(
+            f"invalid format(s) {', '.join(unknown) or value!r} (choose from {', '.join(RENDER_SUFFIXES)})")
+    return formats
+
+
+def build_parser(command=None):
+    """
+    The CLI parser. The export options are only added for command 'export' (or None, all
+    commands): their choices come from export_formats, which the maintenance commands skip.
+    """
     parser = argparse.ArgumentParser(description='Export Spotify playlists to JSON (uses .env)')
-    parser.add_argument('--out', default='exports', help='Output directory for per-playlist JSON files')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    out_parent = argparse.ArgumentParser(add_help=False)
+    out_parent.add_argument('--out', default='exports', help='Output directory for per-playlist JSON files')
+    env_parent = argparse.ArgumentParser(add_help=False)
+    env_parent.add_argument('--env', help='Path to .env (optional)')
+    yes_parent = argparse.ArgumentParser(add_help=False)
+    yes_parent.add_argument('--yes', action='store_true', help='Answer yes to confirmation prompts')
+
+    p = commands.add_parser('export', parents=[out_parent, env_parent],
+                            help='Export playlists (default when no command is given)')
+    p.set_defaults(handler=cmd_export)
+    if command in (None, 'export'):
+        add_export_arguments(p)
+
+    p = commands.add_parser('render', parents=[out_parent],
+                            help='Write txt / CSV / M3U / Markdown files from the existing exports (no API calls)')
+    p.add_argument('--formats', type=render_formats, default=['txt'], metavar='FORMATS',
+                   help='Comma-separated formats to render: txt, csv, m3u, md (default txt)')
+    p.set_defaults(handler=cmd_render)
+    p = commands.add_parser('search', parents=[out_parent],
+                            help='Find the exported playlists containing a track, title or artist (search index)')
+    p.add_argument('query', help='Words of a title / artist name (the last one may be a prefix), or a track id, URI or URL')
+    p.add_argument('--field', choices=('any', 'title', 'artist'), default='any',
+                   help='Match the words in titles or artist names only (default any)')
+    p.add_argument('--limit', type=int, default=50, help='Maximum number of playlists listed (default 50)')
+    p.set_defaults(handler=cmd_search)
+    p = commands.add_parser('purge', parents=[out_parent], help='Purge expired exports in the output directory')
+    p.set_defaults(handler=cmd_purge)
+    p = commands.add_parser('purge-all', parents=[out_parent, yes_parent],
+                            help='Force-delete ALL export files in the output directory (confirmation required unless --yes)')
+    p.set_defaults(handler=cmd_purge_all)
+    p = commands.add_parser('delete-owner', parents=[out_parent],
+                            help='Delete exports for the given owner_id (owner Spotify user id)')
+    p.add_argument('owner_id')
+    p.set_defaults(handler=cmd_delete_owner)
+    p = commands.add_parser('rebuild-index', parents=[out_parent],
+                            help='Rebuild the export and search indexes of the output directory from the export files')
+    p.set_defaults(handler=cmd_rebuild_index)
+    p = commands.add_parser('migrate-layout', parents=[out_parent],
+                            help='Move the exports of the output directory into the flat or sharded layout')
+    p.add_argument('--layout', choices=('flat', 'sharded'), required=True,
+                   help='Target layout: all files in the output directory, or shards/<owner_id>/<hash prefix>/')
+    p.add_argument('--workers', type=int, default=8, help='Number of files moved concurrently (default 8)')
+    p.set_defaults(handler=cmd_migrate_layout)
+    p = commands.add_parser('disconnect', parents=[env_parent, yes_parent],
+                            help='Remove saved SPOTIFY_REFRESH_TOKEN from .env (disconnect)')
+    p.set_defaults(handler=cmd_disconnect)
+    p = commands.add_parser('clear-env', parents=[env_parent, yes_parent],
+                            help='Clear the .env file (truncate). Use with caution.')
+    p.set_defaults(handler=cmd_clear_env)
+    return parser
+
+
+def add_export_arguments(parser):
+    from export_formats import FORMATS
+    # defaults read from the environment are resolved after the .env is loaded (see cmd_export)
     parser.add_argument('--all', action='store_true', help='Export all playlists without prompt')
     parser.add_argument('--no-save-refresh', action='store_true',
                         help="Do NOT save the refresh token to the .env if received")
-    parser.add_argument('--env', help='Path to .env (optional)')
-    parser.add_argument('--purge', action='store_true', help='Purge expired exports in the output directory and exit')
-    parser.add_argument('--purge-all', action='store_true',
-                        help='Force-delete ALL export JSON files in the output directory (confirmation required unless --yes)')
-    parser.add_argument('--delete-owner', help='Delete exports for the given owner_id (owner Spotify user id) and exit')
-    parser.add_argument('--disconnect', action='store_true',
-                        help='Remove saved SPOTIFY_REFRESH_TOKEN from .env (disconnect)')
-    parser.add_argument('--clear-env', action='store_true', help='Clear the .env file (truncate). Use with caution.')
-    parser.add_argument('--yes', action='store_true', help='Answer yes to confirmation prompts')
-    parser.add_argument('--ttl-days', type=int, default=int(os.environ.get('EXPORT_TTL_DAYS', '2')),
+    parser.add_argument('--ttl-days', type=int,
                         help='Number of days to keep exported files (default from ENV or 2)')
     parser.add_argument('--plain-files', action='store_true',
-                        help='Also write plain text files next to the JSON exports')
+                        help='Also write plain text files next to the JSON exports (same as --render txt)')
+    parser.add_argument('--render', type=render_formats, default=[], metavar='FORMATS',
+                        help='Comma-separated formats rendered next to each export in the same pass: '
+                             'txt, csv, m3u, md')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of playlists to fetch and write concurrently (default 1 = serial)')
+    parser.add_argument('--format', dest='fmt', choices=FORMATS, default='json',
+                        help='Export format: pretty JSON, NDJSON, gzip/xz-compressed JSON, or one zip archive per run')
+    parser.add_argument('--normalized', action='store_true',
+                        help='Store each distinct track once in track_store.json; playlists list track ids')
+    parser.add_argument('--layout', choices=('flat', 'sharded'),
+                        help="Directory layout of the exports: flat, or sharded into shards/<owner_id>/<hash prefix>/ "
+                             "(default: the output directory's current layout, flat for a new one)")
+    parser.add_argument('--engine', choices=('threads', 'async'), default='threads',
+                        help='Export engine: blocking requests + threads, or asyncio/aiohttp (--workers = playlists in flight)')
+    parser.add_argument('--page-workers', type=int, default=1,
+                        help='Number of track pages of one playlist to fetch concurrently (default 1 = follow next links)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip playlists whose snapshot_id matches the existing export (only refresh expires_at)')
+    parser.add_argument('--rate-limit', type=float,
+                        help='Maximum API requests per second shared by all workers (default 0 = unlimited)')
+    parser.add_argument('--burst', type=int,
+                        help='Number of requests allowed in a burst above --rate-limit')
+    parser.add_argument('--max-retries', type=int,
+                        help='Retries for 5xx responses, timeouts and connection errors')
+    parser.add_argument('--backoff-max', type=float,
+                        help='Upper bound in seconds for the exponential retry backoff')
+    parser.add_argument('--lean', action='store_true',
+                        help='Request only the exported fields from the API (smaller payloads)')
+    parser.add_argument('--cache-dir',
+                        help='Directory of the on-disk API response cache (default from ENV or ~/.cache/spotify-to-text)')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the on-disk API response cache')
+    parser.add_argument('--cache-ttl', type=int,
+                        help='Seconds a cached response is served without revalidation (default 0 = always revalidate)')
+    parser.add_argument('--cache-max-mb', type=int,
+                        help='Maximum size of the response cache in MB; least recently used entries are evicted')
+    parser.add_argument('--no-search-index', action='store_true',
+                        help='Do not add the exported tracks to the search index (faster exports; the index '
+                             'is dropped and `search` rebuilds it from the files)')
+    parser.add_argument('--enrich', action='store_true',
+                        help='After the export, resolve album, release date, ISRC and artist genres of the '
+                             'exported tracks into track_metadata.json (cached in the cache directory)')
+    parser.add_argument('--metadata-ttl-days', type=int,
+                        help='Days a cached track / artist metadata entry is reused by --enrich (default 30)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted export from its checkpoint (completed playlists and fetched pages)')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and re-sync the selected playlists every --interval seconds, '
+                             'purging expired exports between cycles (stop with SIGTERM / Ctrl+C)')
+    parser.add_argument('--interval', type=int,
+                        help='Seconds between the starts of two daemon sync cycles (default from ENV or 3600)')
+    parser.add_argument('--accounts', metavar='FILE',
+                        help='Export every account listed in FILE (JSON list of {name, refresh_token}) '
+                             'into <out>/<name> in one process')
+    parser.add_argument('--account-workers', type=int, default=1,
+                        help='Number of accounts exported at once in --accounts mode (default 1)')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print a summary of API requests and per-playlist timings after the export')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='Write every API request and playlist timing as one JSON line to FILE')
 
-    args = parser.parse_args()
 
-    env_path = args.env or ENV_PATH
-    ensure_env_file(env_path)
+def normalize_argv(argv):
+    """
+    Map the command line onto a subcommand: an explicit command is kept, the old flags
+    (--purge, --delete-owner ID, ...) become their subcommand and anything else is an export.
+    Returns (argv, legacy) where legacy is True for a translated old-style command line.
+    """
+    if argv and argv[0] in COMMANDS:
+        return argv, False
+    if argv and argv[0] in ('-h', '--help'):
+        return argv, False
+    for flag, command in LEGACY_FLAGS:
+        for i, arg in enumerate(argv):
+            if arg == flag:
+                rest = argv[:i] + argv[i + 1:]
+                if command == 'delete-owner' and i + 1 < len(argv):
+                    rest = [argv[i + 1]] + argv[:i] + argv[i + 2:]
+                return [command] + rest, True
+            if arg.startswith(flag + '='):
+                return [command, arg.split('=', 1)[1]] + argv[:i] + argv[i + 1:], True
+    return ['export'] + argv, False
 
-    # Purge expired or delete-owner or purge-all or clear-env or disconnect
-    if args.purge:
-        removed = purge_expired_exports(args.out)
-        print(f"Removed {len(removed)} files.")
-        sys.exit(0)
 
-    if args.delete_owner:
-        deleted = delete_exports_for_owner(args.out, args.delete_owner)
-        print(f"Deleted {len(deleted)} files for owner {args.delete_owner}.")
-        sys.exit(0)
+def resolve_env_path(args, create=True):
+    """Load the .env (args.env or the one python-dotenv finds) and return its path."""
+    from env_utils import default_env_path, ensure_env_file, load_env
+    load_env()
+    env_path = args.env or default_env_path()
+    if create:
+        ensure_env_file(env_path)
+    return env_path
 
-    if args.purge_all:
-        if args.yes or confirm_prompt(f"This will permanently delete all JSON exports in '{args.out}'. Continue?"):
-            removed = purge_all_exports(args.out)
-            print(f"Force-removed {len(removed)} files.")
-            sys.exit(0)
-        else:
-            print('Aborted purge-all.')
-            sys.exit(1)
-
-    if args.disconnect:
-        if args.yes or confirm_prompt("Remove SPOTIFY_REFRESH_TOKEN from the .env file and disconnect? "):
-            removed = remove_env_key('SPOTIFY_REFRESH_TOKEN', env_path_local=env_path)
-            if removed:
-                print('SPOTIFY_REFRESH_TOKEN removed from .env')
-            else:
-                print('No SPOTIFY_REFRESH_TOKEN found in .env')
-            sys.exit(0)
-        else:
-            print('Disconnect aborted.')
-            sys.exit(1)
-
-    if args.clear_env:
-        if args.yes or confirm_prompt(f"This will truncate/clear the file {env_path}. Continue?"):
-            with open(env_path, 'w', encoding='utf-8') as f:
-                f.write('')
-            print(f'{env_path} truncated (cleared).')
-            sys.exit(0)
+
+def cmd_render(args):
+    if not os.path.isdir(args.out):
+        print(f"No export directory '{args.out}'.")
+        return 1
+    from renderers import render_exports
+    written = render_exports(args.out, args.formats)
+    print(f"Rendered {len(written)} files.")
+    return 0
+
+
+def cmd_search(args):
+    if not os.path.isdir(args.out):
+        print(f"No export directory '{args.out}'.")
+        return 1
+    import time
+    from search_index import search
+    start = time.perf_counter()
+    hits = search(args.out, args.query, None if args.field == 'any' else args.field, args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for hit in hits:
+        where = f"{hit['json_file']}:{hit['member']}" if hit['member'] else hit['json_file']
+        print(f"{hit['playlist_name']} ({hit['playlist_id']}, owner {hit['owner_id']}) - {where}")
+        for _track_id, title, artists in hit['tracks']:
+            print(f"  {title} [{artists}]")
+    print(f"{len(hits)} playlists found in {elapsed_ms:.1f} ms.")
+    return 0 if hits else 1
+
+
+def cmd_purge(args):
+    from purge_utils import purge_expired_exports
+    removed = purge_expired_exports(args.out)
+    print(f"Removed {len(removed)} files.")
+    return 0
+
+
+def cmd_rebuild_index(args):
+    if not os.path.isdir(args.out):
+        print(f"No export directory '{args.out}'.")
+        return 1
+    from export_index import rebuild_index
+    from search_index import rebuild_search_index
+    count = rebuild_index(args.out)
+    print(f"Indexed {count} exports in {args.out}.")
+    count = rebuild_search_index(args.out)
+    print(f"Search index rebuilt for {count} exports.")
+    return 0
+
+
+def cmd_migrate_layout(args):
+    if not os.path.isdir(args.out):
+        print(f"No export directory '{args.out}'.")
+        return 1
+    from export_layout import migrate_layout
+    moved = migrate_layout(args.out, args.layout, workers=args.workers)
+    print(f"Moved {moved} exports into the {args.layout} layout in {args.out}.")
+    return 0
+
+
+def cmd_delete_owner(args):
+    from purge_utils import delete_exports_for_owner
+    deleted = delete_exports_for_owner(args.out, args.owner_id)
+    print(f"Deleted {len(deleted)} files for owner {args.owner_id}.")
+    return 0
+
+
+def cmd_purge_all(args):
+    if args.yes or confirm_prompt(f"This will permanently delete all exports in '{args.out}'. Continue?"):
+        from purge_utils import purge_all_exports
+        removed = purge_all_exports(args.out)
+        print(f"Force-removed {len(removed)} files.")
+        return 0
+    print('Aborted purge-all.')
+    return 1
+
+
+def cmd_disconnect(args):
+    env_path = resolve_env_path(args)
+    if args.yes or confirm_prompt("Remove SPOTIFY_REFRESH_TOKEN from the .env file and disconnect? "):
+        from env_utils import remove_env_key
+        from token_manager import ACCESS_TOKEN_KEY, ACCESS_TOKEN_EXPIRES_KEY
+        removed = remove_env_key('SPOTIFY_REFRESH_TOKEN', env_path_local=env_path)
+        remove_env_key(ACCESS_TOKEN_KEY, env_path_local=env_path)
+        remove_env_key(ACCESS_TOKEN_EXPIRES_KEY, env_path_local=env_path)
+        if removed:
+            print('SPOTIFY_REFRESH_TOKEN removed from .env')
         else:
-            print('Clear .env aborted.')
-            sys.exit(1)
+            print('No SPOTIFY_REFRESH_TOKEN found in .env')
+        return 0
+    print('Disconnect aborted.')
+    return 1
+
+
+def cmd_clear_env(args):
+    env_path = resolve_env_path(args)
+    if args.yes or confirm_prompt(f"This will truncate/clear the file {env_path}. Continue?"):
+        with open(env_path, 'w', encoding='utf-8') as f:
+            f.write('')
+        print(f'{env_path} truncated (cleared).')
+        return 0
+    print('Clear .env aborted.')
+    return 1
+
+
+def apply_export_defaults(args):
+    """Fill in the export options whose defaults come from the environment or other modules."""
+    from rate_limit import DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_MAX
+    from http_cache import DEFAULT_CACHE_DIR, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+    from metadata_cache import DEFAULT_TTL_DAYS
+    defaults = {
+        'ttl_days': int(os.environ.get('EXPORT_TTL_DAYS', '2')),
+        'interval': int(os.environ.get('EXPORT_INTERVAL_SECONDS', '3600')),
+        'cache_dir': os.environ.get('SPOTIFY_CACHE_DIR', DEFAULT_CACHE_DIR),
+        'rate_limit': DEFAULT_RATE,
+        'burst': DEFAULT_BURST,
+        'max_retries': DEFAULT_MAX_RETRIES,
+        'backoff_max': DEFAULT_BACKOFF_MAX,
+        'cache_ttl': DEFAULT_TTL_SECONDS,
+        'cache_max_mb': DEFAULT_MAX_BYTES // (1024 * 1024),
+        'metadata_ttl_days': DEFAULT_TTL_DAYS,
+    }
+    for key, value in defaults.items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+
+
+def metadata_cache_of(args):
+    """The MetadataCache of the --enrich stage (in the cache directory), or None without --enrich."""
+    if not args.enrich:
+        return None
+    from metadata_cache import MetadataCache, METADATA_FILENAME
+    return MetadataCache(os.path.join(args.cache_dir, METADATA_FILENAME), ttl_days=args.metadata_ttl_days)
+
+
+def cmd_export(args):
+    env_path = resolve_env_path(args)
+    apply_export_defaults(args)
+
+    # Batch export of several accounts (own tokens, no .env refresh token needed)
+    if args.accounts:
+        from batch import load_accounts, export_accounts
+        try:
+            accounts = load_accounts(args.accounts, os.environ.get('SPOTIFY_CLIENT_ID'),
+                                     os.environ.get('SPOTIFY_CLIENT_SECRET'))
+        except (OSError, ValueError) as e:
+            print('Invalid accounts file:', e)
+            return 1
+        results = run_export(args, lambda: export_accounts(
+            accounts, args.out, account_workers=args.account_workers, workers=args.workers,
+            page_workers=args.page_workers, ttl_days=args.ttl_days, write_plain_files=bool(args.plain_files),
+            incremental=args.incremental, lean=args.lean, engine=args.engine, fmt=args.fmt,
+            normalized=args.normalized, resume=args.resume, metadata_cache=metadata_cache_of(args),
+            render=args.render, layout=args.layout, search_index=not args.no_search_index))
+        return 1 if any(isinstance(r, Exception) for r in results.values()) else 0
+
+    from env_utils import save_to_env
+    from token_manager import TokenManager
+    from spotify_api import access_token_of
 
     # Normal export flow
     client_id = os.environ.get('SPOTIFY_CLIENT_ID')
@@ -99,42 +375,129 @@ def main():
     existing_refresh = os.environ.get('SPOTIFY_REFRESH_TOKEN')
 
     access_token = None
+    # the cached access token is only persisted when the refresh token may be saved too
+    token_env_path = None if args.no_save_refresh else env_path
 
     if existing_refresh:
         if not client_id or not client_secret:
             print('SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET are required in .env to refresh token.')
-            sys.exit(1)
-        print('Using refresh token from .env to request an access token...')
-        token_data = refresh_token_flow(client_id, client_secret, existing_refresh)
-        access_token = token_data.get('access_token')
+            return 1
+        access_token = TokenManager.from_env(client_id, client_secret, existing_refresh, env_path=token_env_path)
+        if access_token.is_valid():
+            print('Using cached access token from .env...')
+        else:
+            print('Using refresh token from .env to request an access token...')
+            access_token.get()
     else:
         if not client_id or not client_secret:
             print('Please define SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET in .env or environment variables.')
-            sys.exit(1)
+            return 1
+        from auth import authorization_code_flow
         token_data = authorization_code_flow(client_id, client_secret, redirect_uri)
-        access_token = token_data.get('access_token')
         refresh_token = token_data.get('refresh_token')
         if refresh_token and (not args.no_save_refresh):
             print('Saving refresh token into .env for future runs...')
             save_to_env('SPOTIFY_REFRESH_TOKEN', refresh_token, env_path_local=env_path)
             print(f'Refresh token written to {env_path} (protect this file!).')
+        if refresh_token:
+            access_token = TokenManager(client_id, client_secret, refresh_token, env_path=token_env_path)
+            access_token.store(token_data)
+        else:
+            access_token = token_data.get('access_token')
 
-    if not access_token:
+    if not access_token or not access_token_of(access_token):
         print('Unable to obtain access token. Check credentials and .env.')
-        sys.exit(1)
+        return 1
+
+    from export_json import export_playlists_and_tracks
+
+    export_options = dict(
+        export_all=args.all,
+        ttl_days=args.ttl_days,
+        write_plain_files=bool(args.plain_files),
+        workers=args.workers,
+        page_workers=args.page_workers,
+        incremental=args.incremental,
+        lean=args.lean,
+        engine=args.engine,
+        fmt=args.fmt,
+        normalized=args.normalized,
+        resume=args.resume,
+        metadata_cache=metadata_cache_of(args),
+        render=args.render,
+        layout=args.layout,
+        search_index=not args.no_search_index
+    )
+
+    def export():
+        if args.daemon:
+            from daemon import run_daemon
+            # the first cycle's selection (prompted unless --all) is re-synced by every later cycle
+            selection = {}
+
+            def sync_cycle(stop_event):
+                # a cycle resumes from the checkpoint only after a failed cycle (or with --resume)
+                try:
+                    selected = export_playlists_and_tracks(access_token, args.out, stop_event=stop_event,
+                                                           playlist_ids=selection.get('ids'), **export_options)
+                except Exception:
+                    export_options['resume'] = True
+                    raise
+                export_options['resume'] = False
+                if selected is not None and 'ids' not in selection:
+                    selection['ids'] = [pl['id'] for pl in selected]
+
+            run_daemon(sync_cycle, args.out, args.interval)
+        else:
+            export_playlists_and_tracks(access_token, args.out, **export_options)
+
+    run_export(args, export)
+    return 0
+
+
+def run_export(args, export):
+    """Call export() with the rate limit, response cache and --stats / --trace output configured from args."""
+    from spotify_api import configure_cache, configure_rate_limit
+    from instrumentation import add_listener, ExportStats, TraceWriter
+
+    configure_rate_limit(rate=args.rate_limit, burst=args.burst, max_retries=args.max_retries,
+                         backoff_max=args.backoff_max)
+    if not args.no_cache:
+        configure_cache(args.cache_dir, ttl=args.cache_ttl, max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    stats = ExportStats() if args.stats else None
+    trace = TraceWriter(args.trace) if args.trace else None
+    for listener in (stats, trace):
+        if listener is not None:
+            add_listener(listener)
 
     try:
-        export_playlists_and_tracks(
-            access_token,
-            args.out,
-            export_all=args.all,
-            ttl_days=args.ttl_days,
-            write_plain_files=bool(args.plain_files)
-        )
+        return export()
     except Exception as e:
         print('Error:', e)
         sys.exit(1)
+    finally:
+        if stats is not None:
+            print()
+            print(stats.summary())
+        if trace is not None:
+            trace.close()
+            print(f"Trace written to {args.trace}")
+
+
+def main(argv=None):
+    argv, legacy = normalize_argv(list(sys.argv[1:] if argv is None else argv))
+    parser = build_parser(argv[0] if argv and argv[0] in COMMANDS else None)
+    if legacy:
+        # old command lines may mix in export options the maintenance commands do not take
+        args, _ = parser.parse_known_args(argv)
+    else:
+        args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 0
+    return args.handler(args)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Persistent cache of track and artist metadata used by the enrichment stage
+(metadata.sqlite in the response cache directory). Entries are keyed by
+(kind, id) and carry the time they were fetched; entries older than the TTL are
+treated as missing and evicted, so they are fetched again on the next run.
+"""
+import json
+import os
+import sqlite3
+import time
+
+METADATA_FILENAME = 'metadata.sqlite'
+DEFAULT_TTL_DAYS = 30
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS entities (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+)"""
+# SQLite's default limit on bound variables is 999 in older builds
+_CHUNK = 500
+
+
+class MetadataCache:
+    """(kind, id) -> metadata dict store with a TTL; thread-safe (one connection per call)."""
+
+    def __init__(self, path, ttl_days=DEFAULT_TTL_DAYS):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, kind, ids):
+        """Return {id: data} for the ids of kind that are cached and not expired."""
+        found = {}
+        ids = list(ids)
+        cutoff = time.time() - self.ttl
+        conn = self._connect()
+        try:
+            for i in range(0, len(ids), _CHUNK):
+                chunk = ids[i:i + _CHUNK]
+                rows = conn.execute(
+                    f"SELECT id, data FROM entities WHERE kind = ? AND fetched_at > ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})", [kind, cutoff] + chunk)
+                for entity_id, data in rows:
+                    found[entity_id] = json.loads(data)
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, kind, entries):
+        """Store {id: data} for kind, stamped with the current time."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO entities (kind, id, data, fetched_at) VALUES (?, ?, ?, ?)",
+                                 [(kind, entity_id, json.dumps(data, ensure_ascii=False), now)
+                                  for entity_id, data in entries.items()])
+        finally:
+            conn.close()
+
+    def evict_expired(self):
+        """Delete the entries older than the TTL. Returns the number of deleted entries."""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM entities WHERE fetched_at <= ?",
+                                    (time.time() - self.ttl,)).rowcount
+        finally:
+            conn.close()
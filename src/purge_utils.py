@@ -1,104 +1,183 @@
 """
 Utilities to purge expired exports and delete exports for a user (owner_id).
 Also provides purge_all_exports that force-deletes all playlist JSON files.
+Lookups go through the export index (see export_index) instead of parsing every export;
+removed exports are pruned from both the export index and the search index (see search_index),
+and from the track store of normalized exports (see track_store): the tracks no remaining
+export references are dropped.
+Files are removed directory by directory: with the sharded layout (see export_layout), the
+shards are worked through in parallel by up to `workers` threads.
+The helpers that only work on files (export_formats, export_layout) are imported once there
+is something to remove, so a purge with nothing to do (the usual cron run) starts fast.
 """
-# Replace these three functions in src/spotify_export/purge_utils.py
-
 import os
-import json
-from datetime import datetime, timezone
+from utils import now_iso_utc
+from export_index import (has_index, rebuild_index, expired_entries, owner_entries, remove_entries,
+                          clear_index)
+
+PURGE_WORKERS = 8
+
 
 def _remove_file_if_exists(path, removed_list):
-    """Helper: remove path if exists and append to removed_list; ignore missing files."""
+    """
+    Helper: remove path and append it to removed_list; ignore missing files.
+    Returns False if the file is still there (the removal failed).
+    """
     try:
-        if os.path.exists(path):
-            os.remove(path)
-            removed_list.append(path)
-            print('Removed:', path)
+        os.remove(path)
+    except FileNotFoundError:
+        return True
     except Exception as e:
         print('Failed to remove', path, e)
+        return False
+    removed_list.append(path)
+    print('Removed:', path)
+    return True
 
 
-def purge_expired_exports(export_dir):
+def _remove_indexed(export_dir, entries, removed_list, workers=PURGE_WORKERS):
     """
-    Remove JSON files in export_dir whose expires_at is in the past.
-    Also remove matching plain-text sibling files (same base name, .txt).
-    Returns list of removed file paths.
+    Remove the indexed export files (and their rendered siblings, once no export of the playlist is left in
+    the directory) and drop their index and search index entries.
+    Archive entries are removed from their archive, which is deleted once empty.
     """
-    removed = []
-    if not os.path.isdir(export_dir):
-        return removed
+    if not entries:
+        return
+    from export_formats import other_format_paths, rendered_siblings, remove_archive_members
+    from export_layout import in_parallel, remove_empty_dirs
+    gone = []
+    archives = {}
+    directories = {}
+    for playlist_id, json_file, member in entries:
+        if member:
+            archives.setdefault(json_file, []).append(member)
+        else:
+            directories.setdefault(os.path.dirname(json_file), []).append(json_file)
 
-    for fname in os.listdir(export_dir):
-        if not fname.endswith('.json'):
-            continue
-        path = os.path.join(export_dir, fname)
+    def remove_files(json_files):
+        for json_file in json_files:
+            path = os.path.join(export_dir, json_file)
+            if _remove_file_if_exists(path, removed_list):
+                gone.append((json_file, ''))
+            # remove rendered siblings (.txt, .csv, ...) if present (same base name), unless they also
+            # belong to an export of the playlist in another format that is still there (a directory's
+            # files are removed in order, so the last of them takes the rendered files along)
+            if not any(os.path.exists(p) for p in other_format_paths(path)):
+                for sibling in rendered_siblings(path):
+                    _remove_file_if_exists(sibling, removed_list)
 
+    in_parallel(remove_files, directories.values(), workers)
+    remove_empty_dirs(export_dir, [d for d in directories if d])
+    for json_file, members in archives.items():
+        path = os.path.join(export_dir, json_file)
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            expires = data.get('expires_at')
-            if not expires:
-                continue
-            exp_dt = datetime.strptime(expires, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
-            if datetime.now(timezone.utc) >= exp_dt:
-                # remove the json
-                _remove_file_if_exists(path, removed)
-                # remove sibling txt if present (same base name)
-                base = os.path.splitext(path)[0]
-                txt_path = base + '.txt'
-                _remove_file_if_exists(txt_path, removed)
+            if not os.path.exists(path) or remove_archive_members(path, members):
+                removed_list.append(path)
+                print('Removed:', path)
+            else:
+                removed_list.extend(f"{path}:{m}" for m in members)
+                print(f'Removed {len(members)} playlists from', path)
+            gone.extend((json_file, m) for m in members)
         except Exception as e:
             print('Failed to process', path, e)
+    remove_entries(export_dir, gone)
+    if gone:
+        # imported here: a purge with nothing to remove (the usual cron run) does not load it
+        from search_index import remove_search_entries
+        remove_search_entries(export_dir, gone)
+        _prune_track_store(export_dir)
+
+
+def _prune_track_store(export_dir):
+    """
+    Drop the tracks of the directory's track store that no remaining export contains: the
+    search index holds exactly those (it is built from the remaining files if missing).
+    """
+    from track_store import TrackStore, STORE_FILENAME
+    if not os.path.exists(os.path.join(export_dir, STORE_FILENAME)):
+        return
+    from search_index import indexed_track_ids
+    store = TrackStore(export_dir)
+    pruned = store.prune(indexed_track_ids(export_dir))
+    if pruned:
+        store.save()
+        print(f'Removed {pruned} unreferenced tracks from', store.path)
+
+
+def _ensure_index(export_dir):
+    """Build the export index from the files if this directory does not have one yet."""
+    if not has_index(export_dir):
+        count = rebuild_index(export_dir)
+        print(f'Built export index for {count} exports in {export_dir}')
+
+
+def purge_expired_exports(export_dir, workers=PURGE_WORKERS):
+    """
+    Remove exports (any format) in export_dir whose expires_at is in the past.
+    Also remove the rendered sibling files (same base name, .txt / .csv / .m3u / .md).
+    Expired exports are looked up in the export index, so no export file is opened.
+    Returns list of removed file paths.
+    """
+    removed = []
+    if not os.path.isdir(export_dir):
+        return removed
+
+    _ensure_index(export_dir)
+    _remove_indexed(export_dir, expired_entries(export_dir, now_iso_utc()), removed, workers)
     return removed
 
 
-def delete_exports_for_owner(export_dir, owner_id):
+def delete_exports_for_owner(export_dir, owner_id, workers=PURGE_WORKERS):
     """
     Delete any export files in export_dir belonging to owner_id.
-    Also deletes matching .txt sibling files next to each .json.
+    Also deletes the rendered sibling files (.txt, .csv, ...) next to each export.
+    The owner's exports are looked up in the export index.
     Returns list of deleted file paths.
     """
     deleted = []
     if not os.path.isdir(export_dir):
         return deleted
 
-    for fname in os.listdir(export_dir):
-        if not fname.endswith('.json'):
-            continue
-        path = os.path.join(export_dir, fname)
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            if data.get('owner_id') == owner_id:
-                # remove json and matching txt
-                _remove_file_if_exists(path, deleted)
-                base = os.path.splitext(path)[0]
-                txt_path = base + '.txt'
-                _remove_file_if_exists(txt_path, deleted)
-        except Exception as e:
-            print('Failed to process', path, e)
+    _ensure_index(export_dir)
+    _remove_indexed(export_dir, owner_entries(export_dir, owner_id), deleted, workers)
     return deleted
 
 
-def purge_all_exports(export_dir):
+def purge_all_exports(export_dir, workers=PURGE_WORKERS):
     """
-    Force-delete all .json and .txt files in export_dir
+    Force-delete all export files (every format), run archives, .txt files and rendered playlist files in export_dir
+    and its shard directories (which are removed once empty), and the track store they shared.
     Returns list of removed paths.
     """
     removed = []
     if not os.path.isdir(export_dir):
         return removed
+    from export_formats import export_suffix, is_archive, RENDER_SUFFIXES, TEMP_PREFIX
+    from export_layout import in_parallel, scan_dirs, prune_shard_dirs
 
-    for fname in os.listdir(export_dir):
-        # target both json and txt files
-        if not (fname.endswith('.json') or fname.endswith('.txt')):
-            continue
-        path = os.path.join(export_dir, fname)
-        try:
-            os.remove(path)
-            removed.append(path)
-            print('Removed:', path)
-        except Exception as e:
-            print('Failed to remove', path, e)
+    def purge_directory(directory):
+        with os.scandir(directory) as it:
+            names = [e.name for e in it if e.is_file()]
+        for fname in names:
+            # target exports in every format, archives, txt files and the other rendered playlist files,
+            # including the temporary files an interrupted run left behind (see export_formats.temp_path)
+            name = fname[len(TEMP_PREFIX):] if fname.startswith(TEMP_PREFIX) else fname
+            rendered = name.startswith('playlist_') and os.path.splitext(name)[1] in RENDER_SUFFIXES.values()
+            if not (export_suffix(name) or is_archive(name) or name.endswith('.txt') or rendered):
+                continue
+            path = os.path.join(directory, fname)
+            try:
+                os.remove(path)
+                removed.append(path)
+                print('Removed:', path)
+            except Exception as e:
+                print('Failed to remove', path, e)
+
+    in_parallel(purge_directory, scan_dirs(export_dir), workers)
+    prune_shard_dirs(export_dir)
+    from track_store import STORE_FILENAME
+    _remove_file_if_exists(os.path.join(export_dir, STORE_FILENAME), removed)
+    clear_index(export_dir)
+    from search_index import clear_search_index
+    clear_search_index(export_dir)
     return removed
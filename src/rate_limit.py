@@ -0,0 +1,77 @@
+"""
+Process-wide rate control for Spotify API calls.
+RateLimiter is a token bucket shared by every caller (threads included) that also
+holds a global pause: when any request sees a 429, all callers wait out Retry-After.
+RetryPolicy computes exponential backoff with full jitter for transient failures.
+"""
+import random
+import threading
+import time
+
+DEFAULT_RATE = 0          # requests per second, 0 = unlimited
+DEFAULT_BURST = 10
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+
+class RateLimiter:
+    """Token bucket (rate tokens/s, up to burst) with a shared pause-until deadline."""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if the bucket allows it now; otherwise return the seconds to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._paused_until - now
+            if delay > 0:
+                return delay
+            if not self.rate or self.rate <= 0:
+                return 0.0
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until the global pause is over and a token is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """Stop every caller from sending requests for the next `seconds` seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # the bucket refills from the end of the pause, not during it
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for 5xx responses, timeouts and connection errors."""
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base=DEFAULT_BACKOFF_BASE, max_delay=DEFAULT_BACKOFF_MAX):
+        self.max_retries = max_retries
+        self.base = base
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """Seconds to wait before retry number attempt (0-based)."""
+        return random.uniform(0, min(self.max_delay, self.base * (2 ** attempt)))
+
+    def should_retry(self, attempt):
+        return attempt < self.max_retries
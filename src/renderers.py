@@ -0,0 +1,218 @@
+"""
+Human-readable files rendered next to the playlist exports (--render):
+  txt   "Title [Artist1, Artist2]" lines (what --plain-files writes)
+  csv   title, artists, duration, track id (with a header row)
+  m3u   extended M3U playlist of open.spotify.com track links
+  md    Markdown table, headed by the playlist name
+Renderers are compiled once per run (compile_renderers: templates bound to their format
+methods, the Markdown escapes set up) and fed from the same pass that writes the export:
+the fields of each track are computed once and shared by every requested format.
+render_exports() renders existing exports (every per-playlist format, normalized ones
+resolved through their track store) without calling the API.
+"""
+import csv
+import os
+from export_formats import RENDER_SUFFIXES, export_suffix, iter_export, temp_path
+from export_layout import iter_export_files
+
+RENDER_FORMATS = tuple(RENDER_SUFFIXES)
+
+
+def track_fields(t, position):
+    """Template fields of export track dict t at 1-based position."""
+    artists = t.get('artists') or []
+    duration_ms = t.get('duration_ms')
+    track_id = t.get('track_id') or ''
+    return {
+        'position': position,
+        'title': t.get('title') or "<unknown title>",
+        'artists': ", ".join(artists) if artists else "Unknown artist",
+        'duration': t.get('duration') or '',
+        'duration_ms': duration_ms if duration_ms is not None else '',
+        'seconds': duration_ms // 1000 if isinstance(duration_ms, int) else -1,
+        'track_id': track_id,
+        'url': f"https://open.spotify.com/track/{track_id}" if track_id else '',
+    }
+
+
+class Renderer:
+    """One output format: head / line / foot templates formatted with the playlist header and track fields."""
+
+    def __init__(self, name, line, head='', foot='', escape=None):
+        self.name = name
+        self.suffix = RENDER_SUFFIXES[name]
+        self._line = line.format_map
+        self._head = head.format_map
+        self._foot = foot
+        # str.translate table applied to the text fields (title, artists, playlist name)
+        self._escape = str.maketrans(escape) if escape else None
+
+    def filename(self, playlist_id):
+        return f"playlist_{playlist_id}{self.suffix}"
+
+    def _escaped(self, fields, keys):
+        if self._escape is None:
+            return fields
+        return dict(fields, **{k: fields[k].translate(self._escape) for k in keys if isinstance(fields.get(k), str)})
+
+    def begin(self, f, header):
+        """Write the head of file f for the export header; returns the function that writes one track's fields."""
+        f.write(self._head(self._escaped(header, ('playlist_name',))))
+        write, line = f.write, self._line
+        if self._escape is None:
+            return lambda fields: write(line(fields))
+        return lambda fields: write(line(self._escaped(fields, ('title', 'artists'))))
+
+    def end(self, f):
+        f.write(self._foot)
+
+
+class CsvRenderer(Renderer):
+    """CSV rows through the csv module, so quoting follows RFC 4180."""
+
+    COLUMNS = ('position', 'title', 'artists', 'duration', 'duration_ms', 'track_id')
+
+    def __init__(self, name):
+        super().__init__(name, '')
+
+    def begin(self, f, header):
+        writer = csv.writer(f)
+        writer.writerow(self.COLUMNS)
+        columns = self.COLUMNS
+        return lambda fields: writer.writerow([fields[c] for c in columns])
+
+
+def _make_renderer(name):
+    if name == 'txt':
+        return Renderer(name, "{title} [{artists}]\n")
+    if name == 'csv':
+        return CsvRenderer(name)
+    if name == 'm3u':
+        return Renderer(name, "#EXTINF:{seconds},{artists} - {title}\n{url}\n",
+                        head="#EXTM3U\n#PLAYLIST:{playlist_name}\n",
+                        escape={"\n": " ", "\r": " "})
+    if name == 'md':
+        return Renderer(name, "| {position} | {title} | {artists} | {duration} |\n",
+                        head="# {playlist_name}\n\n| # | Title | Artists | Duration |\n|---:|---|---|---:|\n",
+                        escape={"|": "\\|", "\n": " ", "\r": " "})
+    raise ValueError(f"Unknown render format '{name}' (choose from {', '.join(RENDER_FORMATS)})")
+
+
+def compile_renderers(formats):
+    """Renderers for the format names (duplicates dropped, order kept); compile once per run."""
+    return [_make_renderer(name) for name in dict.fromkeys(formats or ())]
+
+
+class RenderedFiles:
+    """
+    The rendered files of one playlist, written track by track alongside its export.
+    Files are written under a temporary name and renamed into place by a complete close;
+    with an archive, they are spooled and added to the run archive instead. A file that
+    cannot be opened is reported and skipped; the export itself carries on.
+    """
+
+    def __init__(self, renderers, out_dir, playlist_id, archive=None, log=print):
+        self.out_dir = out_dir
+        self.archive = archive
+        self.log = log
+        self.outputs = [(r, r.filename(playlist_id)) for r in renderers]
+        self._open = []
+        self.count = 0
+
+    @property
+    def paths(self):
+        """Paths of the rendered files next to the export (none with an archive)."""
+        if self.archive is not None:
+            return []
+        return [os.path.join(self.out_dir, filename) for _r, filename in self.outputs]
+
+    def open(self, header):
+        for renderer, filename in self.outputs:
+            path = os.path.join(self.out_dir, filename)
+            try:
+                f = self.archive.spool() if self.archive is not None else open(temp_path(path), 'w',
+                                                                                 encoding='utf-8', newline='')
+            except Exception as e:
+                self.log(f"Failed to write {renderer.name} file {path}: {e}")
+                continue
+            self._open.append((renderer, filename, f, renderer.begin(f, header)))
+        self.outputs = [(r, filename) for r, filename, _f, _w in self._open]
+        return self
+
+    def add(self, t):
+        if not self._open:
+            return
+        self.count += 1
+        fields = track_fields(t, self.count)
+        for _renderer, _filename, _f, write in self._open:
+            write(fields)
+
+    def close(self, complete=True):
+        """Finish the files and move them into place (complete=True), or discard them."""
+        try:
+            for renderer, filename, f, _write in self._open:
+                if complete:
+                    renderer.end(f)
+                    if self.archive is not None:
+                        self.archive.add(filename, f)
+        except BaseException:
+            complete = False
+            raise
+        finally:
+            for _renderer, filename, f, _write in self._open:
+                f.close()
+                if self.archive is None:
+                    path = os.path.join(self.out_dir, filename)
+                    if complete:
+                        os.replace(temp_path(path), path)
+                    else:
+                        os.remove(temp_path(path))
+
+
+def render_export(path, renderers, store=None, log=print):
+    """
+    Render one existing export file into its sibling files. Normalized exports (track ids)
+    are resolved through store (a TrackStore). Returns the written paths.
+    """
+    header, entries = iter_export(path)
+    if not header or not header.get('playlist_id'):
+        return []
+    if header.get('track_store') and store is None:
+        raise ValueError(f"{path} is a normalized export but no track store was found")
+    out_dir = os.path.dirname(path)
+    files = RenderedFiles(renderers, out_dir, header['playlist_id'], log=log).open(header)
+    complete = False
+    try:
+        for entry in entries:
+            t = store.resolve(entry) if isinstance(entry, str) else entry
+            if t is not None:
+                files.add(t)
+        complete = True
+    finally:
+        files.close(complete)
+    return files.paths
+
+
+def render_exports(export_dir, formats):
+    """
+    Render every playlist export in export_dir (any per-playlist format and layout) into the
+    formats, next to the export, without calling the API. Run archives are skipped.
+    Returns the list of written paths.
+    """
+    from track_store import TrackStore, STORE_FILENAME
+    renderers = compile_renderers(formats)
+    store = TrackStore(export_dir) if os.path.exists(os.path.join(export_dir, STORE_FILENAME)) else None
+    written = []
+    for rel_path, fname in sorted(iter_export_files(export_dir)):
+        if not (fname.startswith('playlist_') and export_suffix(fname)):
+            continue
+        path = os.path.join(export_dir, rel_path)
+        try:
+            paths = render_export(path, renderers, store)
+        except Exception as e:
+            print('Failed to render', path, e)
+            continue
+        for p in paths:
+            print('Wrote:', p)
+        written.extend(paths)
+    return written
@@ -0,0 +1,373 @@
+"""
+SQLite search index over the exported tracks (.search_index.sqlite in the output directory):
+an inverted index from the words of track titles and artist names (and from track ids) to
+the exports containing the tracks, so `search` answers "which playlists contain this
+artist / track" without opening any export file.
+Every written export updates it while it is written (TrackIndexer); purge and delete-owner prune it with the
+export index. It is built from the export files on first use, and rebuild_search_index
+recreates it when files were added or removed by hand.
+"""
+import os
+import re
+import sqlite3
+
+SEARCH_INDEX_FILENAME = '.search_index.sqlite'
+FIELDS = {'title': 't', 'artist': 'a'}
+
+# bump when the tables change; older indexes are dropped and rebuilt from the files
+SCHEMA_VERSION = 1
+_SCHEMA = (
+    """CREATE TABLE files (
+        file_id INTEGER PRIMARY KEY,
+        json_file TEXT NOT NULL,
+        member TEXT NOT NULL DEFAULT '',
+        playlist_id TEXT,
+        playlist_name TEXT,
+        owner_id TEXT,
+        UNIQUE (json_file, member)
+    )""",
+    """CREATE TABLE tracks (
+        track_id TEXT PRIMARY KEY,
+        title TEXT,
+        artists TEXT
+    ) WITHOUT ROWID""",
+    """CREATE TABLE file_tracks (
+        track_id TEXT NOT NULL,
+        file_id INTEGER NOT NULL,
+        PRIMARY KEY (track_id, file_id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX file_tracks_file_id ON file_tracks (file_id)",
+    """CREATE TABLE terms (
+        term TEXT NOT NULL,
+        field TEXT NOT NULL,
+        track_id TEXT NOT NULL,
+        PRIMARY KEY (term, field, track_id)
+    ) WITHOUT ROWID""",
+)
+_TABLES = ('files', 'tracks', 'file_tracks', 'terms')
+# patterns are compiled on first use (re caches them), so purge and delete-owner do not pay for them
+_WORD = r'\w+'
+_TRACK_REF = r'^(?:spotify:track:|https?://open\.spotify\.com/track/)([A-Za-z0-9]+)'
+
+
+def search_index_path(export_dir):
+    return os.path.join(export_dir, SEARCH_INDEX_FILENAME)
+
+
+def has_search_index(export_dir):
+    return os.path.exists(search_index_path(export_dir))
+
+
+def words(text):
+    """Case-folded words of text, as stored in the terms table."""
+    return re.findall(_WORD, text.casefold()) if text else []
+
+
+def entry_key(t):
+    """Track id of an export track dict; tracks without one (local files) get a synthetic local: id."""
+    if t.get('track_id'):
+        return t['track_id']
+    import hashlib
+    key = f"{t.get('title')}|{','.join(t.get('artists') or [])}|{t.get('duration_ms')}"
+    return "local:" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def _connect(export_dir):
+    """
+    Open the index, creating (or upgrading) it from the export files if needed.
+    Each call gets its own connection, so it is thread-safe.
+    """
+    conn = sqlite3.connect(search_index_path(export_dir), timeout=30)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # take the write lock first so concurrent writers build the index only once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                for table in _TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                for header, json_file, member, tracks in _scan_exports(export_dir):
+                    _insert(conn, header, json_file, member, tracks)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            conn.close()
+            raise
+    return conn
+
+
+def _track_row(t):
+    """(track_id, title, artists) row of export track dict t, artists joined with ", "."""
+    artists = [a for a in t.get('artists') or [] if isinstance(a, str)]
+    return entry_key(t), t.get('title'), ", ".join(artists)
+
+
+def _term_rows(track_id, title, artists):
+    """(term, field, track_id) rows of a track row (the words of joined artists are those of each artist)."""
+    rows = [(w, 't', track_id) for w in set(words(title))]
+    rows += [(w, 'a', track_id) for w in set(words(artists))]
+    return rows
+
+
+def _file_id(conn, header, json_file, member):
+    """file_id of an export (created or updated from header), with its previous tracks unlinked."""
+    member = member or ''
+    row = conn.execute("SELECT file_id FROM files WHERE json_file = ? AND member = ?", (json_file, member)).fetchone()
+    if row is None:
+        return conn.execute(
+            "INSERT INTO files (json_file, member, playlist_id, playlist_name, owner_id) VALUES (?, ?, ?, ?, ?)",
+            (json_file, member, header.get('playlist_id'), header.get('playlist_name'),
+             header.get('owner_id'))).lastrowid
+    conn.execute("UPDATE files SET playlist_id = ?, playlist_name = ?, owner_id = ? WHERE file_id = ?",
+                 (header.get('playlist_id'), header.get('playlist_name'), header.get('owner_id'), row[0]))
+    conn.execute("DELETE FROM file_tracks WHERE file_id = ?", row)
+    return row[0]
+
+
+def _insert(conn, header, json_file, member, tracks):
+    """Replace the indexed tracks of one export; tracks is an iterable of export track dicts."""
+    file_id = _file_id(conn, header, json_file, member)
+    for t in tracks:
+        track_id, title, artists = _track_row(t)
+        if conn.execute("INSERT OR IGNORE INTO tracks (track_id, title, artists) VALUES (?, ?, ?)",
+                        (track_id, title, artists)).rowcount:
+            # terms are written once per track, when it is first indexed
+            conn.executemany("INSERT OR IGNORE INTO terms (term, field, track_id) VALUES (?, ?, ?)",
+                             _term_rows(track_id, title, artists))
+        conn.execute("INSERT OR IGNORE INTO file_tracks (track_id, file_id) VALUES (?, ?)", (track_id, file_id))
+
+
+class TrackIndexer:
+    """
+    Indexes the tracks of one export as its pages are written (open, add per page, then
+    commit once the export is in place, or abort). Pages are staged in a temporary table
+    of the indexer's own connection, so memory stays flat however long the playlist is and
+    no lock on the index is held while it downloads; commit moves them into the index in
+    one short transaction, computing the terms only of the tracks the index does not have
+    yet (tracks shared by many playlists are tokenized once). Index errors are reported and
+    stop indexing the export; they never fail it. json_file / member are the same keys as
+    in the export index.
+    """
+
+    def __init__(self, export_dir, header, json_file, member=None):
+        self.export_dir = export_dir
+        self.header = header
+        self.json_file = json_file
+        self.member = member
+        self._conn = None
+
+    def _failed(self, e):
+        print('Failed to update search index', search_index_path(self.export_dir), e)
+        self.abort()
+
+    def open(self):
+        try:
+            self._conn = _connect(self.export_dir)
+            self._conn.execute("CREATE TEMP TABLE pending_tracks (track_id TEXT PRIMARY KEY, title TEXT, artists TEXT)")
+        except sqlite3.Error as e:
+            self._failed(e)
+        return self
+
+    def add(self, tracks):
+        """Stage one page of export track dicts."""
+        if self._conn is None:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO pending_tracks VALUES (?, ?, ?)", map(_track_row, tracks))
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def commit(self):
+        """Replace the export's tracks in the index with the staged ones."""
+        if self._conn is None:
+            return
+        conn = self._conn
+        try:
+            with conn:
+                file_id = _file_id(conn, self.header, self.json_file, self.member)
+                # terms are written once per track, when it is first indexed
+                new_tracks = conn.execute("SELECT track_id, title, artists FROM pending_tracks "
+                                          "WHERE track_id NOT IN (SELECT track_id FROM tracks)")
+                conn.executemany("INSERT OR IGNORE INTO terms (term, field, track_id) VALUES (?, ?, ?)",
+                                 (term for row in new_tracks for term in _term_rows(*row)))
+                conn.execute("INSERT OR IGNORE INTO tracks (track_id, title, artists) "
+                             "SELECT track_id, title, artists FROM pending_tracks")
+                conn.execute("INSERT OR IGNORE INTO file_tracks (track_id, file_id) "
+                             "SELECT track_id, ? FROM pending_tracks", (file_id,))
+        except sqlite3.Error as e:
+            self._failed(e)
+            return
+        self.abort()
+
+    def abort(self):
+        """Drop the staged tracks (the index is left as it was)."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def remove_search_entries(export_dir, keys):
+    """
+    Drop the given (json_file, member) exports from the search index, and the tracks no
+    export contains any more. Does nothing if the directory has no search index yet.
+    """
+    if not keys or not has_search_index(export_dir):
+        return
+    conn = _connect(export_dir)
+    try:
+        with conn:
+            file_ids = []
+            for json_file, member in keys:
+                row = conn.execute("SELECT file_id FROM files WHERE json_file = ? AND member = ?",
+                                   (json_file, member or '')).fetchone()
+                if row is not None:
+                    file_ids.append(row)
+            # only the tracks of the removed exports can become orphans
+            candidates = set()
+            for file_id in file_ids:
+                candidates.update(row[0] for row in conn.execute(
+                    "SELECT track_id FROM file_tracks WHERE file_id = ?", file_id))
+            conn.executemany("DELETE FROM file_tracks WHERE file_id = ?", file_ids)
+            conn.executemany("DELETE FROM files WHERE file_id = ?", file_ids)
+            orphans = [track_id for track_id in candidates
+                       if conn.execute("SELECT 1 FROM file_tracks WHERE track_id = ? LIMIT 1",
+                                       (track_id,)).fetchone() is None]
+            for track_id in orphans:
+                row = conn.execute("SELECT title, artists FROM tracks WHERE track_id = ?", (track_id,)).fetchone()
+                if row is None:
+                    continue
+                # the track's terms, by primary key
+                conn.executemany("DELETE FROM terms WHERE term = ? AND field = ? AND track_id = ?",
+                                 _term_rows(track_id, *row))
+                conn.execute("DELETE FROM tracks WHERE track_id = ?", (track_id,))
+    finally:
+        conn.close()
+
+
+def indexed_track_ids(export_dir):
+    """Ids of the tracks contained in at least one indexed export (the index is built from the files if needed)."""
+    conn = _connect(export_dir)
+    try:
+        return {row[0] for row in conn.execute("SELECT track_id FROM tracks")}
+    finally:
+        conn.close()
+
+
+def rename_search_entries(export_dir, moves):
+    """Point moved export files at their new path; moves are (json_file, new json_file)."""
+    if not moves or not has_search_index(export_dir):
+        return
+    conn = _connect(export_dir)
+    try:
+        with conn:
+            conn.executemany("UPDATE files SET json_file = ? WHERE json_file = ? AND member = ''",
+                             [(new, old) for old, new in moves])
+    finally:
+        conn.close()
+
+
+def clear_search_index(export_dir):
+    """Remove the search index file."""
+    try:
+        os.remove(search_index_path(export_dir))
+    except FileNotFoundError:
+        pass
+
+
+def _scan_exports(export_dir):
+    """Yield (header, json_file, member, track dicts) for every export in export_dir (archives included)."""
+    # imported here: only index builds read the files
+    from export_formats import export_suffix, is_archive, iter_export, iter_archive_exports
+    from export_layout import iter_export_files
+    store = None
+    for rel_path, fname in sorted(iter_export_files(export_dir)):
+        path = os.path.join(export_dir, rel_path)
+        try:
+            if is_archive(fname):
+                exports = [(header, rel_path, member, entries)
+                           for member, header, entries in iter_archive_exports(path)]
+            elif fname.startswith('playlist_') and export_suffix(fname):
+                header, entries = iter_export(path)
+                exports = [(header, rel_path, None, entries)] if header and header.get('playlist_id') else []
+            else:
+                continue
+            for header, json_file, member, entries in exports:
+                if header.get('track_store') and store is None:
+                    from track_store import TrackStore
+                    store = TrackStore(export_dir)
+                tracks = [store.resolve(e) if isinstance(e, str) else e for e in entries]
+                yield header, json_file, member, [t for t in tracks if t]
+        except Exception as e:
+            print('Failed to process', path, e)
+
+
+def rebuild_search_index(export_dir):
+    """Recreate the search index from the export files. Returns the number of indexed exports."""
+    clear_search_index(export_dir)
+    conn = _connect(export_dir)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _matching_tracks(query, field=None):
+    """SQL (and parameters) selecting the track ids that match every word of query; the last word matches as a prefix."""
+    match = re.match(_TRACK_REF, query.strip())
+    if match:
+        return "SELECT ? AS track_id", [match.group(1)]
+    terms = words(query)
+    if not terms:
+        return None, []
+    parts, params = [], []
+    field_sql = " AND field = ?" if field else ""
+    for i, term in enumerate(terms):
+        if i == len(terms) - 1:
+            parts.append(f"SELECT track_id FROM terms WHERE term >= ? AND term < ?{field_sql}")
+            params += [term, term + "\U0010ffff"]
+        else:
+            parts.append(f"SELECT track_id FROM terms WHERE term = ?{field_sql}")
+            params.append(term)
+        if field:
+            params.append(FIELDS[field])
+    if len(terms) == 1 and not field:
+        # a bare word may also be a track id
+        parts = [parts[0] + " UNION SELECT track_id FROM tracks WHERE track_id = ?"]
+        params.append(query.strip())
+    return " INTERSECT ".join(parts), params
+
+
+def search(export_dir, query, field=None, limit=50):
+    """
+    Exports containing tracks that match query: every word of it (in the title or artists,
+    or only in `field`, 'title' / 'artist') or a track id / spotify:track URI / track URL.
+    Returns up to limit dicts {playlist_id, playlist_name, owner_id, json_file, member,
+    tracks: [(track_id, title, artists)]}, ordered by playlist name.
+    """
+    matching, params = _matching_tracks(query, field)
+    if matching is None:
+        return []
+    conn = _connect(export_dir)
+    try:
+        rows = conn.execute(
+            f"""SELECT f.file_id, f.playlist_id, f.playlist_name, f.owner_id, f.json_file, f.member,
+                       t.track_id, t.title, t.artists
+                FROM ({matching}) m
+                JOIN file_tracks ft ON ft.track_id = m.track_id
+                JOIN files f ON f.file_id = ft.file_id
+                JOIN tracks t ON t.track_id = m.track_id
+                ORDER BY f.playlist_name, f.json_file, f.member, t.title""", params).fetchall()
+    finally:
+        conn.close()
+    hits = {}
+    for file_id, playlist_id, name, owner_id, json_file, member, track_id, title, artists in rows:
+        if file_id not in hits:
+            if len(hits) >= limit:
+                break
+            hits[file_id] = {'playlist_id': playlist_id, 'playlist_name': name, 'owner_id': owner_id,
+                             'json_file': json_file, 'member': member, 'tracks': []}
+        hits[file_id]['tracks'].append((track_id, title, artists))
+    return list(hits.values())
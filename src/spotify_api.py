@@ -1,45 +1,299 @@
 """
 Contains wrappers for Spotify Web API calls (GET + paging) and rate-limit handling.
+All calls go through one shared, connection-pooled requests.Session so that
+repeated calls (and concurrent workers) reuse open TLS connections.
+iter_pages streams a paged endpoint page by page and can optionally fan out over
+page offsets once the first page gives the total; paged_get collects it into a list.
+Responses can optionally be cached on disk (see http_cache) and revalidated by ETag.
+Every request goes through a shared rate limiter; a 429 pauses all callers and
+transient 5xx/connection failures are retried with jittered backoff (see rate_limit).
+Every call is reported to the instrumentation listeners (see instrumentation).
 """
+import hashlib
+import threading
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 import requests
+from requests.adapters import HTTPAdapter
 import time
+from utils import loads_json
+from instrumentation import emit, request_event
+from http_cache import ResponseCache, DEFAULT_CACHE_DIR, DEFAULT_TTL_SECONDS, DEFAULT_MAX_BYTES
+from rate_limit import (RateLimiter, RetryPolicy, DEFAULT_RATE, DEFAULT_BURST, DEFAULT_MAX_RETRIES,
+                        DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX)
+
+DEFAULT_POOL_SIZE = 10
+
+_session = None
+_pool_size = 0
+_session_lock = threading.Lock()
+_cache = None
+_limiter = RateLimiter()
+_retry_policy = RetryPolicy()
+
+
+def configure_session(pool_size=DEFAULT_POOL_SIZE):
+    """(Re)create the shared session with a connection pool of pool_size per host."""
+    global _session, _pool_size
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    with _session_lock:
+        old, _session, _pool_size = _session, session, pool_size
+    if old is not None:
+        old.close()
+    return session
+
+
+def ensure_pool_size(pool_size):
+    """
+    Make sure the shared session can hold pool_size connections, recreating it only when
+    its pool is smaller, so warm connections survive repeated exports in one process.
+    """
+    with _session_lock:
+        current = _pool_size if _session is not None else 0
+    if pool_size > current:
+        configure_session(pool_size=max(pool_size, DEFAULT_POOL_SIZE))
+    return get_session()
+
+
+def get_session():
+    """Return the shared session, creating it with the default pool size on first use."""
+    with _session_lock:
+        session = _session
+    return session if session is not None else configure_session()
+
+
+def configure_cache(directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+    """Enable the on-disk response cache for spotify_get (directory=None disables it)."""
+    global _cache
+    _cache = ResponseCache(directory, ttl=ttl, max_bytes=max_bytes) if directory else None
+    return _cache
+
+
+def get_cache():
+    """Return the active ResponseCache, or None when caching is disabled."""
+    return _cache
+
+
+def configure_rate_limit(rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                         backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX):
+    """Replace the shared rate limiter (rate requests/s, 0 = unlimited) and retry policy."""
+    global _limiter, _retry_policy
+    _limiter = RateLimiter(rate=rate, burst=burst)
+    _retry_policy = RetryPolicy(max_retries=max_retries, base=backoff_base, max_delay=backoff_max)
+    return _limiter
+
+
+def get_rate_limiter():
+    """Return the shared RateLimiter (also used by the async client)."""
+    return _limiter
+
+
+def get_retry_policy():
+    """Return the shared RetryPolicy (also used by the async client)."""
+    return _retry_policy
+
+
+def pause_for_retry_after(retry_after):
+    """Pause every caller for Retry-After (+1s) seconds after a 429."""
+    retry = int(retry_after or '1')
+    print(f"Rate limited by Spotify API. Waiting {retry} seconds...")
+    _limiter.pause(retry + 1)
 
 
 def handle_rate_limit(resp):
+    """On a 429, pause every caller for Retry-After (+1s) seconds. Returns True if the request must be retried."""
     if resp.status_code == 429:
-        retry = int(resp.headers.get('Retry-After', '1'))
-        print(f"Rate limited by Spotify API. Waiting {retry} seconds...")
-        time.sleep(retry + 1)
+        pause_for_retry_after(resp.headers.get('Retry-After'))
         return True
     return False
 
 
+def retry_delay(attempt, reason):
+    """Seconds to wait before retrying a transient failure, or None once retries are exhausted."""
+    if not _retry_policy.should_retry(attempt):
+        return None
+    delay = _retry_policy.delay(attempt)
+    print(f"{reason} — retrying in {delay:.1f} seconds ({attempt + 1}/{_retry_policy.max_retries})...")
+    return delay
+
+
+def _backoff(attempt, reason, event=None):
+    """Sleep before retrying a transient failure, or return False once retries are exhausted."""
+    delay = retry_delay(attempt, reason)
+    if delay is None:
+        return False
+    time.sleep(delay)
+    if event is not None:
+        event['retries'] += 1
+        event['backoff_s'] += delay
+    return True
+
+
+def access_token_of(token):
+    """Current bearer token for token, which is either a string or a TokenManager."""
+    return token if isinstance(token, str) else token.get()
+
+
+def cache_account(token):
+    """
+    Account id of token in response cache keys: a hash of the refresh token of a
+    TokenManager (stable across runs), or of the access token itself.
+    """
+    secret = getattr(token, 'refresh_token', None) or access_token_of(token)
+    return hashlib.sha256(secret.encode('utf-8')).hexdigest()[:16]
+
+
 def spotify_get(url, token, params=None):
-    headers = {"Authorization": f"Bearer {token}"}
+    """
+    GET url and return the decoded JSON body. token is an access token string or a
+    TokenManager; with a manager, a 401 triggers one token refresh and a retry.
+    Each call is reported as an instrumentation 'request' event.
+    """
+    event = request_event(url)
+    started = time.perf_counter()
+    try:
+        return _spotify_get(url, token, params, event)
+    except Exception as e:
+        event['error'] = str(e)
+        raise
+    finally:
+        event['latency_s'] = time.perf_counter() - started
+        emit(event)
+
+
+def _spotify_get(url, token, params, event):
+    headers = {}
+    session = get_session()
+    cache = _cache
+    cache_key = entry = None
+    if cache is not None:
+        cache_key = cache.key(url, params, cache_account(token))
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if cache.is_fresh(entry):
+                event['cache'] = 'hit'
+                return entry['body']
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+    attempt = 0
+    refreshed = isinstance(token, str)
     while True:
-        resp = requests.get(url, headers=headers, params=params, timeout=30)
+        event['rate_limit_wait_s'] += _limiter.acquire()
+        bearer = access_token_of(token)
+        headers["Authorization"] = f"Bearer {bearer}"
+        try:
+            resp = session.get(url, headers=headers, params=params, timeout=30)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if _backoff(attempt, f"Request to Spotify API failed ({e.__class__.__name__})", event):
+                attempt += 1
+                continue
+            raise RuntimeError(f"Spotify API request failed: {e}") from e
+        event['status'] = resp.status_code
+        event['bytes'] += len(resp.content)
         if handle_rate_limit(resp):
+            event['retries'] += 1
+            continue
+        if resp.status_code == 401 and not refreshed:
+            token.invalidate(bearer)
+            refreshed = True
+            event['retries'] += 1
+            continue
+        if resp.status_code >= 500 and _backoff(attempt, f"Spotify API error {resp.status_code}", event):
+            attempt += 1
             continue
+        if resp.status_code == 304 and entry is not None:
+            event['cache'] = 'revalidated'
+            return cache.revalidated(cache_key, entry)
         if resp.status_code >= 400:
             raise RuntimeError(f"Spotify API error {resp.status_code}: {resp.text}")
-        return resp.json()
+        data = loads_json(resp.content)
+        if cache is not None:
+            cache.put(cache_key, resp.headers.get('ETag'), data)
+        return data
 
 
-def paged_get(url, token, params=None):
-    items = []
+def _paging_object(data):
+    """Return the paging object ({items, next, total, ...}) inside a response, or None."""
+    if not isinstance(data, dict):
+        return None
+    if 'items' in data:
+        return data
+    if 'tracks' in data and isinstance(data['tracks'], dict) and 'items' in data['tracks']:
+        return data['tracks']
+    return None
+
+
+def _offset_url(next_url, offset):
+    """Rewrite the offset query parameter of a `next` link."""
+    parsed = urlparse(next_url)
+    query = parse_qs(parsed.query)
+    query['offset'] = [str(offset)]
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def _carry_params(next_url, params):
+    """Add request params (e.g. fields) that the API left out of a `next` link."""
+    if not params:
+        return next_url
+    parsed = urlparse(next_url)
+    query = parse_qs(parsed.query)
+    missing = {k: [str(v)] for k, v in params.items() if k not in query and k != 'offset'}
+    if not missing:
+        return next_url
+    query.update(missing)
+    return urlunparse(parsed._replace(query=urlencode(query, doseq=True)))
+
+
+def iter_pages(url, token, params=None, page_workers=1):
+    """
+    Yield the items of a paged endpoint one page at a time, as the pages arrive.
+    With page_workers > 1 the first page's total/limit are used to fetch the
+    remaining offsets concurrently (at most page_workers pages in flight, yielded
+    in API order); when the response has no total, paging follows the `next` links.
+    A response that is not a paging object is yielded as-is.
+    """
     next_url = url
     local_params = None if params is None else dict(params)
     while next_url:
         data = spotify_get(next_url, token, params=local_params)
         local_params = None
-        if isinstance(data, dict):
-            if 'items' in data:
-                items.extend(data['items'])
-            elif 'tracks' in data and isinstance(data['tracks'], dict) and 'items' in data['tracks']:
-                items.extend(data['tracks']['items'])
-            else:
-                return data
-            next_url = data.get('next')
-        else:
-            break
+        page = _paging_object(data)
+        if page is None:
+            if isinstance(data, dict):
+                yield data
+            return
+        yield page['items']
+        next_url = page.get('next')
+        if next_url:
+            next_url = _carry_params(next_url, params)
+        if next_url and page_workers and page_workers > 1:
+            total, limit = page.get('total'), page.get('limit')
+            if total is not None and limit:
+                offset = page.get('offset') or 0
+                offsets = iter(range(offset + limit, total, limit))
+                with ThreadPoolExecutor(max_workers=page_workers) as pool:
+                    window = deque(pool.submit(spotify_get, _offset_url(next_url, o), token)
+                                   for o in islice(offsets, page_workers))
+                    while window:
+                        data = window.popleft().result()
+                        for o in islice(offsets, 1):
+                            window.append(pool.submit(spotify_get, _offset_url(next_url, o), token))
+                        page = _paging_object(data)
+                        if page is not None:
+                            yield page['items']
+                return
+
+
+def paged_get(url, token, params=None, page_workers=1):
+    """GET every page of a paged endpoint and return the concatenated items (see iter_pages)."""
+    items = []
+    for page in iter_pages(url, token, params=params, page_workers=page_workers):
+        if isinstance(page, dict):
+            return page
+        items.extend(page)
     return items
@@ -0,0 +1,176 @@
+"""
+asyncio counterparts of spotify_get / iter_pages, built on aiohttp (optional dependency).
+Same semantics as spotify_api: paging (with optional offset fan-out), 429 handling,
+retries, error reporting and instrumentation events, and it shares the rate limiter, retry policy and
+response cache configured there. The blocking parts (response cache file I/O, token refreshes)
+run on the loop's default executor, so they never stall the other requests in flight.
+"""
+import asyncio
+import time
+from collections import deque
+from itertools import islice
+
+try:
+    import aiohttp
+except ImportError:  # only needed for --engine async
+    aiohttp = None
+
+from utils import loads_json
+from instrumentation import emit, request_event
+from spotify_api import (access_token_of, cache_account, get_cache, get_rate_limiter, pause_for_retry_after,
+                         retry_delay, DEFAULT_POOL_SIZE, _paging_object, _offset_url, _carry_params)
+
+
+class AsyncSpotifyClient:
+    """aiohttp session bound to one access token (or TokenManager). Use as an async context manager."""
+
+    def __init__(self, token, pool_size=DEFAULT_POOL_SIZE):
+        if aiohttp is None:
+            raise RuntimeError("The async engine requires aiohttp (pip install aiohttp).")
+        self.token = token
+        self.pool_size = pool_size
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        return False
+
+    async def _bearer(self):
+        """The current access token; a TokenManager refresh (a blocking request) runs in the executor."""
+        if isinstance(self.token, str) or self.token.is_valid():
+            return access_token_of(self.token)
+        return await asyncio.get_running_loop().run_in_executor(None, access_token_of, self.token)
+
+    async def get(self, url, params=None):
+        """Async spotify_get: GET url and return the decoded JSON body."""
+        event = request_event(url)
+        started = time.perf_counter()
+        try:
+            return await self._get(url, params, event)
+        except Exception as e:
+            event['error'] = str(e)
+            raise
+        finally:
+            event['latency_s'] = time.perf_counter() - started
+            emit(event)
+
+    async def _get(self, url, params, event):
+        headers = {}
+        loop = asyncio.get_running_loop()
+        cache = get_cache()
+        limiter = get_rate_limiter()
+        cache_key = entry = None
+        if cache is not None:
+            cache_key = cache.key(url, params, cache_account(self.token))
+            entry = await loop.run_in_executor(None, cache.get, cache_key)
+            if entry is not None:
+                if cache.is_fresh(entry):
+                    event['cache'] = 'hit'
+                    return entry['body']
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+        attempt = 0
+        refreshed = isinstance(self.token, str)
+        while True:
+            delay = limiter.try_acquire()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                event['rate_limit_wait_s'] += delay
+                continue
+            bearer = await self._bearer()
+            headers["Authorization"] = f"Bearer {bearer}"
+            try:
+                async with self._session.get(url, headers=headers, params=params) as resp:
+                    status = resp.status
+                    body = await resp.read()
+                    retry_after = resp.headers.get('Retry-After')
+                    etag = resp.headers.get('ETag')
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                delay = retry_delay(attempt, f"Request to Spotify API failed ({e.__class__.__name__})")
+                if delay is None:
+                    raise RuntimeError(f"Spotify API request failed: {e}") from e
+                attempt += 1
+                await asyncio.sleep(delay)
+                event['retries'] += 1
+                event['backoff_s'] += delay
+                continue
+            event['status'] = status
+            event['bytes'] += len(body)
+            if status == 429:
+                pause_for_retry_after(retry_after)
+                event['retries'] += 1
+                continue
+            if status == 401 and not refreshed:
+                self.token.invalidate(bearer)
+                refreshed = True
+                event['retries'] += 1
+                continue
+            if status >= 500:
+                delay = retry_delay(attempt, f"Spotify API error {status}")
+                if delay is not None:
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    event['retries'] += 1
+                    event['backoff_s'] += delay
+                    continue
+            if status == 304 and entry is not None:
+                event['cache'] = 'revalidated'
+                return await loop.run_in_executor(None, cache.revalidated, cache_key, entry)
+            if status >= 400:
+                raise RuntimeError(f"Spotify API error {status}: {body.decode('utf-8', 'replace')}")
+            data = loads_json(body)
+            if cache is not None:
+                await loop.run_in_executor(None, cache.put, cache_key, etag, data)
+            return data
+
+    async def iter_pages(self, url, params=None, page_workers=1):
+        """Async iter_pages: yield the items of a paged endpoint page by page, in API order."""
+        next_url = url
+        local_params = None if params is None else dict(params)
+        while next_url:
+            data = await self.get(next_url, params=local_params)
+            local_params = None
+            page = _paging_object(data)
+            if page is None:
+                if isinstance(data, dict):
+                    yield data
+                return
+            yield page['items']
+            next_url = page.get('next')
+            if next_url:
+                next_url = _carry_params(next_url, params)
+            if next_url and page_workers and page_workers > 1:
+                total, limit = page.get('total'), page.get('limit')
+                if total is not None and limit:
+                    offset = page.get('offset') or 0
+                    offsets = iter(range(offset + limit, total, limit))
+                    window = deque(asyncio.ensure_future(self.get(_offset_url(next_url, o)))
+                                   for o in islice(offsets, page_workers))
+                    try:
+                        while window:
+                            data = await window.popleft()
+                            for o in islice(offsets, 1):
+                                window.append(asyncio.ensure_future(self.get(_offset_url(next_url, o))))
+                            page = _paging_object(data)
+                            if page is not None:
+                                yield page['items']
+                    finally:
+                        for task in window:
+                            task.cancel()
+                    return
+
+    async def paged_get(self, url, params=None, page_workers=1):
+        """Async paged_get: return the concatenated items of every page."""
+        items = []
+        async for page in self.iter_pages(url, params=params, page_workers=page_workers):
+            if isinstance(page, dict):
+                return page
+            items.extend(page)
+        return items
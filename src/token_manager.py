@@ -0,0 +1,74 @@
+"""
+Access-token lifecycle for long or frequent runs.
+TokenManager caches the access token and its expiry in the .env so a run started
+while the previous token is still valid skips the refresh round trip, refreshes
+proactively shortly before expiry, and refreshes on a 401 during an export.
+spotify_get accepts a TokenManager anywhere a plain access token string is accepted.
+"""
+import os
+import threading
+import time
+from env_utils import save_to_env
+
+ACCESS_TOKEN_KEY = 'SPOTIFY_ACCESS_TOKEN'
+ACCESS_TOKEN_EXPIRES_KEY = 'SPOTIFY_ACCESS_TOKEN_EXPIRES_AT'
+REFRESH_MARGIN_SECONDS = 300
+
+
+class TokenManager:
+    """Hands out a valid access token, refreshing it from the refresh token when needed."""
+
+    def __init__(self, client_id, client_secret, refresh_token, access_token=None, expires_at=0,
+                 env_path=None, margin=REFRESH_MARGIN_SECONDS):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.env_path = env_path
+        self.margin = margin
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, client_id, client_secret, refresh_token, env_path=None):
+        """Create a manager seeded with the access token cached in the environment (if any)."""
+        try:
+            expires_at = int(os.environ.get(ACCESS_TOKEN_EXPIRES_KEY) or 0)
+        except ValueError:
+            expires_at = 0
+        return cls(client_id, client_secret, refresh_token, access_token=os.environ.get(ACCESS_TOKEN_KEY),
+                   expires_at=expires_at, env_path=env_path)
+
+    def is_valid(self):
+        """True if the current access token is not within margin seconds of expiry."""
+        return bool(self.access_token) and time.time() < self.expires_at - self.margin
+
+    def store(self, token_data):
+        """Adopt a token response (access_token, expires_in, optional rotated refresh_token)."""
+        self.access_token = token_data.get('access_token')
+        self.expires_at = int(time.time()) + int(token_data.get('expires_in', 3600))
+        if token_data.get('refresh_token'):
+            self.refresh_token = token_data['refresh_token']
+        if self.env_path and self.access_token:
+            save_to_env(ACCESS_TOKEN_KEY, self.access_token, env_path_local=self.env_path)
+            save_to_env(ACCESS_TOKEN_EXPIRES_KEY, str(self.expires_at), env_path_local=self.env_path)
+            if token_data.get('refresh_token'):
+                save_to_env('SPOTIFY_REFRESH_TOKEN', self.refresh_token, env_path_local=self.env_path)
+
+    def get(self):
+        """Return a valid access token, refreshing first if it expires within the margin."""
+        with self._lock:
+            if not self.is_valid():
+                self._refresh()
+            return self.access_token
+
+    def invalidate(self, access_token):
+        """Mark access_token as rejected (401); the next get() refreshes unless another caller already did."""
+        with self._lock:
+            if access_token == self.access_token:
+                self.expires_at = 0
+
+    def _refresh(self):
+        from auth import refresh_token_flow  # imported on first refresh: it pulls in requests
+        print('Refreshing Spotify access token...')
+        self.store(refresh_token_flow(self.client_id, self.client_secret, self.refresh_token))
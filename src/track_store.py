@@ -0,0 +1,111 @@
+"""
+Normalized track store for --normalized exports.
+Tracks and artists are kept once in track_store.json in the output directory, keyed
+by track_id / artist id; normalized playlist exports list track ids instead of full
+track dicts. Strings are interned and durations formatted once per run, so tracks
+shared by many playlists cost one dict instead of one per playlist.
+The store is only rewritten when tracks were added or pruned (purge and delete-owner
+drop the tracks no remaining export references, see purge_utils).
+"""
+import json
+import os
+import sys
+import threading
+from utils import ms_to_hhmmss
+
+STORE_FILENAME = 'track_store.json'
+
+
+def local_track_id(track):
+    """Synthetic id for tracks without a Spotify id (local files)."""
+    import hashlib
+    artists = ",".join(a.get('name') or '' for a in track.get('artists', []) or [])
+    key = f"{track.get('name')}|{artists}|{track.get('duration_ms')}"
+    return "local:" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class TrackStore:
+    """Shared track/artist table, loaded from and saved to out_dir/track_store.json."""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, STORE_FILENAME)
+        self.tracks = {}
+        self.artists = {}
+        self._durations = {}
+        self._changed = False
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.artists = {sys.intern(k): sys.intern(v) for k, v in data.get('artists', {}).items()}
+            self.tracks = {sys.intern(k): v for k, v in data.get('tracks', {}).items()}
+
+    def _duration(self, ms):
+        if ms not in self._durations:
+            self._durations[ms] = ms_to_hhmmss(ms)
+        return self._durations[ms]
+
+    def add(self, track):
+        """
+        Store a raw API track object (once per track_id) and return (track_id, track dict),
+        where the dict has the same fields as a non-normalized export entry.
+        """
+        track_id = track.get('id') or local_track_id(track)
+        with self._lock:
+            entry = self.tracks.get(track_id)
+            if entry is None:
+                artist_ids = []
+                for a in track.get('artists', []) or []:
+                    name = a.get('name')
+                    if not name:
+                        continue
+                    artist_id = sys.intern(a.get('id') or f"name:{name}")
+                    self.artists.setdefault(artist_id, sys.intern(name))
+                    artist_ids.append(artist_id)
+                duration_ms = track.get('duration_ms')
+                entry = {
+                    'title': sys.intern(track.get('name')) if track.get('name') else track.get('name'),
+                    'artist_ids': artist_ids,
+                    'duration_ms': duration_ms,
+                    'duration': self._duration(duration_ms)
+                }
+                self.tracks[sys.intern(track_id)] = entry
+                self._changed = True
+        return track_id, self.resolve(track_id)
+
+    def resolve(self, track_id):
+        """Expand a stored track into the export track dict (track_id, title, artists, duration...)."""
+        entry = self.tracks.get(track_id)
+        if entry is None:
+            return None
+        return {
+            'track_id': track_id,
+            'title': entry['title'],
+            'artists': [self.artists.get(a, a) for a in entry['artist_ids']],
+            'duration_ms': entry['duration_ms'],
+            'duration': entry['duration']
+        }
+
+    def prune(self, referenced):
+        """Drop the tracks whose id is not in referenced, and the artists of no remaining track. Returns the count."""
+        with self._lock:
+            unreferenced = [track_id for track_id in self.tracks if track_id not in referenced]
+            for track_id in unreferenced:
+                del self.tracks[track_id]
+            if unreferenced:
+                artist_ids = {a for entry in self.tracks.values() for a in entry['artist_ids']}
+                self.artists = {k: v for k, v in self.artists.items() if k in artist_ids}
+                self._changed = True
+        return len(unreferenced)
+
+    def save(self):
+        """Write the store atomically (temp file + rename), unless nothing changed since it was loaded."""
+        if not self._changed:
+            return
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'artists': self.artists, 'tracks': self.tracks}, f, ensure_ascii=False,
+                          separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self._changed = False
@@ -1,16 +1,33 @@
 """
 Utility helpers used by the other modules.
 """
-from datetime import timedelta
 import time
 
 ISO_FMT = "%Y-%m-%dT%H:%M:%SZ"
 
+# decoder of loads_json, picked on first use: the maintenance commands only need now_iso_utc,
+# and importing orjson / json / datetime up front costs them several milliseconds of startup
+_loads = None
+
+
+def loads_json(data):
+    """Decode JSON from bytes/str, using orjson when it is installed."""
+    global _loads
+    if _loads is None:
+        try:
+            import orjson
+            _loads = orjson.loads
+        except ImportError:  # optional fast JSON decoder
+            import json
+            _loads = json.loads
+    return _loads(data)
+
 
 def ms_to_hhmmss(ms):
     """Convert milliseconds to H:MM:SS string or return None if ms is None."""
     if ms is None:
         return None
+    from datetime import timedelta
     s = int(ms / 1000)
     return str(timedelta(seconds=s))
 
@@ -18,3 +35,4 @@ def ms_to_hhmmss(ms):
 def now_iso_utc():
     """Return current UTC time in ISO format used by exports."""
     return time.strftime(ISO_FMT, time.gmtime())
+
@@ -0,0 +1,104 @@
+"""
+Writer stage of the export pipeline. The fetching side (a playlist worker thread or the
+async event loop) hands each page to the stage and goes on downloading, while a writer
+thread reduces, serializes and writes the pages in order; disk and network time overlap,
+and a playlist's files are finished (renamed into place, indexed) by the writer while the
+next playlist is already downloading. Each playlist keeps at most max_pending pages
+queued, so memory stays bounded when the disk is slower than the network.
+With several writers, each playlist is pinned to one of them (its pages stay in order)
+and compression runs on several threads.
+"""
+import asyncio
+import itertools
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_MAX_PENDING = 4
+
+
+class WriteStage:
+    """`writers` background writer threads, each running its writes in FIFO order; use as a context manager."""
+
+    def __init__(self, writers=1):
+        self._lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-writer')
+                       for _ in range(max(1, writers))]
+        self._next = itertools.cycle(self._lanes)
+
+    def lane(self):
+        """The writer (an executor with a submit method) for the next playlist, round robin."""
+        return next(self._next)
+
+    def close(self):
+        """Wait for the queued writes and stop the writer threads."""
+        for lane in self._lanes:
+            lane.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class InlineStage:
+    """Runs every write on the calling thread, as soon as it is submitted (no overlap)."""
+
+    def lane(self):
+        return self
+
+    def submit(self, fn, *args):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+
+
+class PageQueue:
+    """
+    The writes of one playlist in flight on a stage. put() waits for the oldest write once
+    max_pending are queued, and a failed write is raised on the fetching side there (or by
+    drain), so a playlist stops fetching when its files cannot be written.
+    """
+
+    def __init__(self, stage, max_pending=DEFAULT_MAX_PENDING):
+        self.lane = stage.lane()
+        self.max_pending = max(1, max_pending)
+        self._pending = deque()
+
+    def put(self, fn, *args):
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+        self._pending.append(self.lane.submit(fn, *args))
+
+    async def put_async(self, fn, *args):
+        """put() for coroutines: waits for the writer without blocking the event loop."""
+        while len(self._pending) >= self.max_pending:
+            # shielded: cancelling the task must not drop a queued write (abort comes after them)
+            await asyncio.shield(asyncio.wrap_future(self._pending.popleft()))
+        self._pending.append(self.lane.submit(fn, *args))
+
+    def close(self, finish, abort):
+        """
+        Queue the end of the playlist: finish() once every queued write succeeded, else
+        abort(exception) and re-raise. Returns the future of finish()'s result.
+        """
+        pending = list(self._pending)
+        self._pending.clear()
+
+        def run():
+            try:
+                for fut in pending:
+                    fut.result()
+            except BaseException as e:
+                abort(e)
+                raise
+            return finish()
+        return self.lane.submit(run)
+
+    def abort(self, abort, exc):
+        """Queue abort(exc) after the writes in flight (the fetching side failed); their errors are dropped."""
+        self._pending.clear()
+        return self.lane.submit(abort, exc)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from instrumentation import percentile  # noqa: E402
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 95) == 95
+    assert percentile(values, 50) == 50
+    assert percentile(values, 7) == 7
+    assert percentile(values, 100) == 100
+    assert percentile([1, 2], 50) == 1
+    assert percentile([1, 2], 51) == 2
+
+
+def test_percentile_bounds():
+    assert percentile([], 50) == 0.0
+    assert percentile([3], 0) == 3
+    assert percentile([3], 95) == 3
+    assert percentile([1, 2, 3], 0) == 1